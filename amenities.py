@@ -0,0 +1,96 @@
+import json
+from typing import Dict, Iterable, List, Optional, Union
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from database import engine, insert_ignore
+
+
+def normalize(value: Union[None, str, Iterable[str]]) -> List[str]:
+    """Accepte une liste, une chaîne "wifi, pool" ou l'ancien format JSON et renvoie des noms uniques"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("["):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                value = value.strip("[]").split(",")
+        else:
+            value = value.split(",")
+    names = []
+    for item in value:
+        for name in str(item).split(","):
+            name = name.strip().strip('"').lower()
+            if name and name not in names:
+                names.append(name)
+    return names
+
+
+def to_text(names: List[str]) -> Optional[str]:
+    return ",".join(names) or None
+
+
+async def _amenity_ids(db: AsyncSession, names: Iterable[str]) -> Dict[str, int]:
+    names = set(names)
+    if not names:
+        return {}
+    await db.execute(insert_ignore(models.Amenity.__table__), [{"name": name} for name in names])
+    rows = await db.execute(select(models.Amenity.name, models.Amenity.id).where(models.Amenity.name.in_(names)))
+    return dict(rows.all())
+
+
+async def set_amenities(db: AsyncSession, amenities_by_property: Dict[int, List[str]]):
+    """Remplace les équipements des propriétés données (dans la transaction en cours)"""
+    if not amenities_by_property:
+        return
+    ids = await _amenity_ids(db, (name for names in amenities_by_property.values() for name in names))
+    await db.execute(delete(models.PropertyAmenity).where(models.PropertyAmenity.property_id.in_(list(amenities_by_property))))
+    links = [
+        {"property_id": property_id, "amenity_id": ids[name]}
+        for property_id, names in amenities_by_property.items()
+        for name in names
+    ]
+    if links:
+        await db.execute(models.PropertyAmenity.__table__.insert(), links)
+
+
+async def remove_amenities(db: AsyncSession, property_ids: Iterable[int]):
+    await db.execute(delete(models.PropertyAmenity).where(models.PropertyAmenity.property_id.in_(list(property_ids))))
+
+
+def having_all(names: List[str]):
+    """Condition "la propriété possède tous ces équipements", résolue sur l'index property_amenities"""
+    matching = select(models.PropertyAmenity.property_id).join(
+        models.Amenity, models.Amenity.id == models.PropertyAmenity.amenity_id
+    ).where(models.Amenity.name.in_(names)).group_by(models.PropertyAmenity.property_id).having(
+        func.count() == len(names)
+    )
+    return models.Property.id.in_(matching)
+
+
+def _backfill(conn: Connection):
+    # Propriétés dont le texte d'équipements n'a pas encore été normalisé
+    pending = conn.execute(
+        select(models.Property.id, models.Property.amenities).where(
+            models.Property.amenities.is_not(None),
+            models.Property.amenities != "",
+            ~exists().where(models.PropertyAmenity.property_id == models.Property.id),
+        )
+    ).all()
+    for property_id, text in pending:
+        names = normalize(text)
+        if names:
+            conn.execute(insert_ignore(models.Amenity.__table__), [{"name": name} for name in names])
+            ids = dict(conn.execute(select(models.Amenity.name, models.Amenity.id).where(models.Amenity.name.in_(names))).all())
+            conn.execute(models.PropertyAmenity.__table__.insert(), [{"property_id": property_id, "amenity_id": ids[name]} for name in names])
+        conn.execute(models.Property.__table__.update().where(models.Property.id == property_id).values(amenities=to_text(names)))
+    return len(pending)
+
+
+def backfill():
+    """Migre les anciennes chaînes (JSON ou séparées par des virgules) vers property_amenities"""
+    with engine.begin() as conn:
+        return _backfill(conn)
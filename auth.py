@@ -1,18 +1,19 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
 import schemas
-from database import get_db
+from database import AsyncWriteSessionLocal, get_async_db
+import hashing
+from cache import TTLCache
+from revocation import RevocationStore, SQLiteRevocationBackend
 import os
-import dotenv
-dotenv.load_dotenv()
 import secrets
 import base64
+import uuid
 
 def generate_secret_key():
     """Génère une clé secrète sécurisée"""
@@ -23,51 +24,110 @@ SECRET_KEY = "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Cache des utilisateurs authentifiés, indexé par id (évite une requête par appel protégé)
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 1024))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def invalidate_principal(user_id: int):
+    principal_cache.pop(user_id)
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(models.User).filter(models.User.email == email).first()
+# Jetons révoqués à la déconnexion ; REVOCATION_DB active un stockage partagé entre workers
+REVOCATION_DB = os.getenv("REVOCATION_DB")
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", 5))
+revocation_store = RevocationStore(
+    backend=SQLiteRevocationBackend(REVOCATION_DB) if REVOCATION_DB else None,
+    sync_interval=REVOCATION_SYNC_INTERVAL,
+)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_principal(target.id)
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await db.scalar(select(models.User).where(models.User.email == email))
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await hashing.verify_and_update(password, user.hashed_password)
+    if not valid:
         return False
+    # Re-hache de façon transparente si le facteur de coût a changé (courte session d'écriture dédiée)
+    if new_hash:
+        async with AsyncWriteSessionLocal() as writer:
+            await writer.execute(update(models.User).where(models.User.id == user.id).values(hashed_password=new_hash))
+            await writer.commit()
+        user.hashed_password = new_hash
     return user
 
+def user_token_claims(user) -> dict:
+    return {"sub": user.email, "uid": user.id, "is_active": user.is_active}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    from jose import jwt  # python-jose est chargé au premier jeton, pas au démarrage
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def decode_token(token: str) -> Optional[dict]:
+    """Contenu du jeton, ou None s'il est invalide ou expiré"""
+    from jose import JWTError, jwt
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+    payload = decode_token(token)
+    if payload is None:
+        raise credentials_exception
+    email: str = payload.get("sub")
+    user_id: Optional[int] = payload.get("uid")
+    if email is None:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
+    jti: Optional[str] = payload.get("jti")
+    if jti is not None and await revocation_store.is_revoked(jti):
         raise credentials_exception
-    return user
+    
+    if user_id is not None:
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
+        if payload.get("is_active") is False:
+            raise HTTPException(status_code=400, detail="Inactive user")
+        user = await db.scalar(select(models.User).where(models.User.id == user_id))
+    else:
+        # Anciens jetons sans claim "uid"
+        user = await db.scalar(select(models.User).where(models.User.email == email))
+    if user is None or user.email != email:
+        raise credentials_exception
+    
+    principal = schemas.User.model_validate(user)
+    principal_cache.set(principal.id, principal)
+    return principal
+
+async def revoke_token(token: str):
+    payload = decode_token(token)
+    if payload is None:
+        return False
+    jti = payload.get("jti")
+    if jti is None:
+        return False
+    await revocation_store.revoke(jti, float(payload["exp"]))
+    return True
 
 async def get_current_active_user(current_user: schemas.User = Depends(get_current_user)):
     if not current_user.is_active:
@@ -0,0 +1,110 @@
+"""Mise en place commune des benchmarks : base SQLite temporaire, schéma, peuplement, libération des ressources.
+
+Les modules de l'application lisent leur configuration à l'import : configure() est appelé avant de les importer.
+"""
+import os
+import random
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CITIES = ["Paris", "Lyon", "Douala", "Yaoundé", "Abidjan", "Dakar", "Marseille", "Lille"]
+PASSWORD = "bench-password"
+BASE_DATE = datetime(2026, 1, 1, 14, tzinfo=timezone.utc)
+BATCH = 10000
+
+
+def configure(database: str = "bench.db", replace_database: bool = False, **settings):
+    """DATABASE_URL vers un fichier d'un répertoire temporaire (sauf si déjà fixée) et réglages par défaut du script"""
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), database)}"
+    if replace_database:
+        os.environ["DATABASE_URL"] = url
+    else:
+        os.environ.setdefault("DATABASE_URL", url)
+    for key, value in settings.items():
+        os.environ.setdefault(key, str(value))
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def seed(users: int = 1, properties: int = 0, bookings: int = 0, favorites: int = 0,
+         rng: Optional[random.Random] = None, property_fields: Optional[Callable[[int, random.Random], dict]] = None):
+    """Peuple la base par insertions groupées : utilisateurs user{i}@example.com (mot de passe PASSWORD),
+    propriétés (champs remplacés par property_fields(i, rng)), réservations sans chevauchement et favoris"""
+    from sqlalchemy import insert
+    import database
+    import hashing
+    import models
+    import search
+    import stats
+
+    rng = rng or random.Random(42)
+    # Un seul hash bcrypt partagé : le peuplement ne doit pas dépendre du facteur de coût
+    hashed_password = hashing.get_context().hash(PASSWORD)
+    with database.SessionLocal() as db:
+        db.execute(insert(models.User), [
+            {"email": f"user{i}@example.com", "username": f"user{i}", "hashed_password": hashed_password}
+            for i in range(users)
+        ])
+        for start in range(0, properties, BATCH):
+            rows = []
+            for i in range(start, min(properties, start + BATCH)):
+                row = {"title": f"Property {i}", "description": f"Logement {i} à {CITIES[i % len(CITIES)]}",
+                       "city": CITIES[i % len(CITIES)], "country": "FR", "price_per_night": rng.randint(20, 500),
+                       "capacity": rng.randint(1, 8), "owner_id": i % users + 1}
+                if property_fields:
+                    row.update(property_fields(i, rng))
+                rows.append(row)
+            db.execute(insert(models.Property), rows)
+        # Séjours de 3 nuits, une semaine d'écart par propriété : aucun chevauchement
+        for start in range(0, bookings, BATCH):
+            db.execute(insert(models.Booking), [
+                {"property_id": i % properties + 1, "user_id": rng.randint(1, users),
+                 "check_in": BASE_DATE + timedelta(days=7 * (i // properties)),
+                 "check_out": BASE_DATE + timedelta(days=7 * (i // properties) + 3),
+                 "total_price": 300.0, "status": "confirmed"}
+                for i in range(start, min(bookings, start + BATCH))
+            ])
+        pairs = {(rng.randint(1, users), rng.randint(1, properties)) for _ in range(favorites)}
+        if pairs:
+            db.execute(insert(models.Favorite), [{"user_id": u, "property_id": p} for u, p in pairs])
+        db.commit()
+    search.rebuild_index()
+    if bookings:
+        stats.rebuild()
+
+
+def setup(**counts):
+    """Schéma, migrations et index (ASGITransport ne déclenche pas le lifespan), puis peuplement éventuel"""
+    import bootstrap
+
+    bootstrap.init_db()
+    if counts:
+        seed(**counts)
+
+
+async def release():
+    """Ce que ferait l'arrêt de l'application : pool bcrypt et connexions libérés"""
+    import database
+    import hashing
+
+    hashing.shutdown()
+    await database.async_engine.dispose()
+    await database.write_engine.dispose()
+
+
+@asynccontextmanager
+async def prepared(**counts):
+    """Base prête (voir setup) pendant la mesure, ressources libérées à la sortie"""
+    setup(**counts)
+    try:
+        yield
+    finally:
+        await release()
@@ -0,0 +1,71 @@
+"""Temps de `import main` dans un processus neuf, comparé à un budget (code de sortie 1 si dépassé).
+
+Usage : python benchmarks/import_time.py --runs 5 --budget-ms 1000 [--profile]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import _env
+from _env import ROOT
+
+# Modules qui ne doivent plus être chargés au démarrage
+LAZY_MODULES = ("jose", "passlib", "uvicorn", "django")
+
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(elapsed, ','.join(name for name in {lazy!r} if name in sys.modules))\n"
+)
+
+
+def measure(env) -> tuple:
+    output = subprocess.check_output([sys.executable, "-c", PROBE.format(lazy=LAZY_MODULES)], cwd=ROOT, env=env, text=True)
+    elapsed, loaded = output.strip().splitlines()[-1].partition(" ")[::2]
+    return float(elapsed), [name for name in loaded.split(",") if name]
+
+
+def profile(env, top: int = 15):
+    """Modules les plus coûteux (temps cumulé) d'après python -X importtime"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=env,
+                            capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in sorted(rows, reverse=True)[:top]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    parser.add_argument("--profile", action="store_true")
+    args = parser.parse_args()
+
+    _env.configure("import.db")
+    env = dict(os.environ)
+    timings, loaded = [], []
+    for _ in range(args.runs):
+        elapsed, loaded = measure(env)
+        timings.append(elapsed * 1000)
+    timings.sort()
+    best = timings[0]
+    result = {
+        "runs": args.runs,
+        "best_ms": round(best, 1),
+        "median_ms": round(timings[len(timings) // 2], 1),
+        "budget_ms": args.budget_ms,
+        "eagerly_loaded": loaded,
+        "ok": best <= args.budget_ms and not loaded,
+    }
+    if args.profile:
+        result["profile"] = profile(env)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["ok"] else 1)
@@ -0,0 +1,60 @@
+"""Mesure le débit de /api/auth/login/ sous concurrence, en processus (ASGI).
+
+Usage : python benchmarks/login_throughput.py --requests 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import _env
+from _env import PASSWORD, percentile
+
+
+async def run(total: int, concurrency: int):
+    import httpx
+    import hashing
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with _env.prepared(users=1), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        credentials = {"email": "user0@example.com", "password": PASSWORD}
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        statuses = {}
+
+        async def login():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/auth/login/", json=credentials)
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "bcrypt_rounds": hashing.BCRYPT_ROUNDS,
+        "hash_workers": hashing.HASH_WORKERS,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "statuses": statuses,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    # Toutes les connexions viennent d'une même IP : sans cela, la limitation de débit répondrait 429 au-delà du budget
+    _env.configure(RATE_LIMIT_ENABLED="false", MAX_CONCURRENT_REQUESTS="0")
+    print(json.dumps(asyncio.run(run(args.requests, args.concurrency)), indent=2))
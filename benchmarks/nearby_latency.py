@@ -0,0 +1,69 @@
+"""Latence de GET /api/properties/nearby sur un jeu synthétique de positions.
+
+Usage : python benchmarks/nearby_latency.py --rows 1000000 --queries 200 --radius 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import _env
+from _env import percentile
+
+# Points tirés autour de quelques grandes villes, plus un bruit réparti sur le globe
+CITIES = [(48.8566, 2.3522), (45.764, 4.8357), (51.5074, -0.1278), (40.7128, -74.006),
+          (35.6762, 139.6503), (-33.8688, 151.2093), (4.0511, 9.7679), (3.848, 11.5021)]
+
+
+def position(i: int, rng: random.Random) -> dict:
+    import geo
+
+    if i % 10:
+        lat, lon = rng.choice(CITIES)
+        lat, lon = lat + rng.gauss(0, 0.5), lon + rng.gauss(0, 0.5)
+    else:
+        lat, lon = rng.uniform(-85, 85), rng.uniform(-180, 180)
+    return {"latitude": lat, "longitude": lon, "geohash": geo.encode(lat, lon)}
+
+
+async def run(rows: int, queries: int, radius: float):
+    import crud
+    import database
+
+    start = time.perf_counter()
+    rng = random.Random(7)
+    latencies, found = [], 0
+    async with _env.prepared(properties=rows, property_fields=position):
+        seed_s = time.perf_counter() - start
+        async with database.AsyncSessionLocal() as db:
+            for _ in range(queries):
+                lat, lon = rng.choice(CITIES)
+                start = time.perf_counter()
+                nearby = await crud.get_nearby_properties(db, latitude=lat + rng.gauss(0, 0.2), longitude=lon + rng.gauss(0, 0.2),
+                                                          radius_km=radius, limit=50)
+                latencies.append(time.perf_counter() - start)
+                found += len(nearby)
+
+    latencies.sort()
+    return {
+        "rows": rows,
+        "queries": queries,
+        "radius_km": radius,
+        "avg_results": round(found / queries, 1),
+        "seed_s": round(seed_s, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=5.0)
+    args = parser.parse_args()
+
+    _env.configure()
+    print(json.dumps(asyncio.run(run(args.rows, args.queries, args.radius)), indent=2))
@@ -0,0 +1,175 @@
+"""Vérifie le plan (EXPLAIN QUERY PLAN) de chaque requête émise par les fonctions de crud sur SQLite.
+
+Usage : python benchmarks/query_plans.py [--verbose]
+
+Chaque fonction est appelée sur une petite base peuplée ; toutes les requêtes SELECT/UPDATE/DELETE
+émises sont capturées puis expliquées. Un "SCAN <table>" sans index est un parcours complet :
+le script échoue (code 1) sauf pour les listes paginées de ALLOWED_SCANS.
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+import _env
+
+# Listes paginées sans filtre : le parcours dans l'ordre de la clé primaire, arrêté par LIMIT, est voulu
+ALLOWED_SCANS = {
+    "get_users": {"users"},
+    "get_bookings": {"bookings"},
+    "get_available_properties": {"properties"},
+}
+CHECKED_STATEMENTS = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+captured = []
+current_function = [None]
+
+
+def capture(conn, cursor, statement, parameters, context, executemany):
+    if current_function[0] and not executemany and CHECKED_STATEMENTS.match(statement):
+        captured.append((current_function[0], statement, parameters))
+
+
+async def call(name, coroutine):
+    current_function[0] = name
+    try:
+        return await coroutine
+    finally:
+        current_function[0] = None
+
+
+async def exercise():
+    """Appelle chaque fonction de lecture et d'écriture de crud (et des modules qu'il utilise)"""
+    import crud
+    import database
+    import idempotency
+    import jobs
+    import pricing
+    import schemas
+    import stats
+
+    now = datetime.now(timezone.utc)
+    check_in, check_out = now + timedelta(days=10), now + timedelta(days=12)
+    async with database.AsyncWriteSessionLocal() as db:
+        owner = await crud.create_user(db, schemas.UserCreate(email="owner@example.com", username="owner", password="pw"))
+        guest = await crud.create_user(db, schemas.UserCreate(email="guest@example.com", username="guest", password="pw"))
+        properties = [
+            await crud.create_property(db, schemas.PropertyCreate(
+                title=f"Villa {i}", description="vue mer", price_per_night=50 + i, city="Douala", country="CM",
+                amenities=["wifi", "pool"], latitude=4.05 + i / 100, longitude=9.7), owner.id)
+            for i in range(3)
+        ]
+        await crud.bulk_create_properties(db, [schemas.PropertyCreate(title="Studio", price_per_night=30)], owner.id)
+        booking = await crud.create_booking(db, schemas.BookingCreate(property_id=properties[0].id, check_in=check_in, check_out=check_out), guest.id)
+        favorite = await crud.create_favorite(db, schemas.FavoriteCreate(property_id=properties[1].id), guest.id)
+        rule = await crud.create_price_rule(db, properties[0].id, schemas.PriceRuleCreate(weekdays=[5, 6], multiplier=1.2), owner.id)
+
+    calls = [
+        ("get_user", lambda db: crud.get_user(db, owner.id)),
+        ("get_user_detail", lambda db: crud.get_user_detail(db, owner.id)),
+        ("get_user_by_email", lambda db: crud.get_user_by_email(db, owner.email)),
+        ("get_users", lambda db: crud.get_users(db)),
+        ("get_property", lambda db: crud.get_property(db, properties[0].id)),
+        ("get_property_detail", lambda db: crud.get_property_detail(db, properties[0].id)),
+        ("get_properties", lambda db: crud.get_properties(db, limit=20)),
+        ("get_properties", lambda db: crud.get_properties(db, city="Douala", limit=20)),
+        ("get_properties", lambda db: crud.get_properties(db, country="CM", limit=20)),
+        ("get_properties", lambda db: crud.get_properties(db, is_available=True, limit=20)),
+        ("get_properties", lambda db: crud.get_properties(db, min_price=40, max_price=60, limit=20)),
+        ("get_properties", lambda db: crud.get_properties(db, amenities=["wifi"], limit=20)),
+        ("get_properties", lambda db: crud.get_properties(
+            db, limit=20, cursor=crud.encode_cursor(properties[1].created_at, properties[1].id))),
+        ("get_nearby_properties", lambda db: crud.get_nearby_properties(db, 4.05, 9.7, 5)),
+        ("search_properties", lambda db: crud.search_properties(db, "villa mer")),
+        ("get_user_properties", lambda db: crud.get_user_properties(db, owner.id)),
+        ("has_booking_conflict", lambda db: crud.has_booking_conflict(db, properties[0].id, check_in, check_out)),
+        ("get_available_properties", lambda db: crud.get_available_properties(db, check_in, check_out)),
+        ("get_booking", lambda db: crud.get_booking(db, booking.id)),
+        ("get_bookings", lambda db: crud.get_bookings(db)),
+        ("get_user_bookings", lambda db: crud.get_user_bookings(db, guest.id)),
+        ("get_favorite", lambda db: crud.get_favorite(db, favorite.id)),
+        ("get_favorites", lambda db: crud.get_favorites(db, guest.id)),
+        ("get_favorite_property_ids", lambda db: crud.get_favorite_property_ids(db, guest.id)),
+        ("owner_stats", lambda db: stats.owner_stats(db, owner.id)),
+        ("get_price_rules", lambda db: crud.get_price_rules(db, properties[0].id)),
+        ("pricing.quote_many", lambda db: pricing.quote_many(db, properties[0], [(check_in, check_out)])),
+        ("create_price_rule", lambda db: crud.create_price_rule(
+            db, properties[2].id, schemas.PriceRuleCreate(start_date=check_in.date(), end_date=check_out.date(), price_per_night=90), owner.id)),
+        ("delete_price_rule", lambda db: crud.delete_price_rule(db, properties[0].id, rule.id, owner.id)),
+        ("idempotency.replay", lambda db: idempotency.replay(db, guest.id, "key", "hash")),
+        ("update_property", lambda db: crud.update_property(db, properties[2].id, schemas.PropertyCreate(
+            title="Villa 2 rénovée", price_per_night=80, amenities=["wifi"]), owner.id)),
+        ("update_booking", lambda db: crud.update_booking(db, booking.id, schemas.BookingCreate(
+            property_id=properties[0].id, check_in=check_in, check_out=check_out + timedelta(days=1)), guest.id)),
+        ("add_favorites", lambda db: crud.add_favorites(db, [p.id for p in properties], guest.id)),
+        ("remove_favorites", lambda db: crud.remove_favorites(db, [properties[2].id], guest.id)),
+        ("idempotency.save", lambda db: idempotency.save(db, guest.id, "key", "hash", 204)),
+        ("delete_favorite", lambda db: crud.delete_favorite(db, favorite.id, guest.id)),
+        ("delete_booking", lambda db: crud.delete_booking(db, booking.id, guest.id)),
+        ("delete_property", lambda db: crud.delete_property(db, properties[1].id, owner.id)),
+        # Réservation des tâches enregistrées par les écritures ci-dessus, puis leurs traitements
+        ("jobs.run_pending", lambda db: jobs.run_pending()),
+    ]
+    for name, function in calls:
+        async with database.AsyncWriteSessionLocal() as db:
+            await call(name, function(db))
+
+
+def explain(statement, parameters):
+    import database
+
+    with database.engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters or ())).all()]
+
+
+async def run(verbose: bool):
+    from sqlalchemy import event
+    import database
+
+    tables = set(__import__("models").Base.metadata.tables)
+    async with _env.prepared():
+        for target in database.engines():
+            event.listen(target, "before_cursor_execute", capture)
+        try:
+            await exercise()
+        finally:
+            for target in database.engines():
+                event.remove(target, "before_cursor_execute", capture)
+
+    failures, checked, seen = [], [], set()
+    for function, statement, parameters in captured:
+        if (statement, tuple(parameters or ())) in seen:
+            continue
+        seen.add((statement, tuple(parameters or ())))
+        plan = explain(statement, parameters)
+        scans = {m.group(1) for m in map(FULL_SCAN.match, plan) if m and m.group(1) in tables}
+        unexpected = scans - ALLOWED_SCANS.get(function, set())
+        checked.append({"function": function, "plan": plan, "sql": " ".join(statement.split())[:200]})
+        if unexpected:
+            failures.append({"function": function, "full_scans": sorted(unexpected), "plan": plan,
+                             "sql": " ".join(statement.split())[:300]})
+
+    result = {
+        "functions": len({item["function"] for item in checked}),
+        "statements": len(checked),
+        "full_scans": len(failures),
+        "failures": failures,
+    }
+    if verbose:
+        result["checked"] = checked
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verbose", action="store_true", help="affiche le plan de chaque requête")
+    args = parser.parse_args()
+
+    # Plans propres à SQLite : la base est toujours un fichier temporaire, même si DATABASE_URL est fixée
+    _env.configure("plans.db", replace_database=True, BCRYPT_ROUNDS="4")
+    result = asyncio.run(run(args.verbose))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(1 if result["failures"] else 0)
@@ -0,0 +1,93 @@
+"""Limitation de débit et admission sous charge : rafale de connexions depuis une IP, puis surcharge globale.
+
+Usage : python benchmarks/rate_limit.py --flood 300 --overload 200
+
+- une IP envoie --flood connexions simultanées : au plus RATE_LIMIT_AUTH atteignent bcrypt, les autres reçoivent 429 ;
+- une autre IP se connecte normalement pendant ce temps ;
+- --overload inscriptions depuis des IP distinctes dépassent MAX_CONCURRENT_REQUESTS : l'excédent reçoit 503.
+Code de sortie 1 si bcrypt est appelé au-delà du budget, si l'autre IP est refusée ou si une réponse 500 est observée.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import _env
+from _env import PASSWORD
+
+
+def bcrypt_calls(operation: str) -> int:
+    import metrics
+    return sum(metrics.bcrypt_duration.counts.get(metrics._labels(operation=operation), []))
+
+
+async def statuses_of(requests):
+    responses = await asyncio.gather(*requests)
+    counts = {}
+    for response in responses:
+        counts[str(response.status_code)] = counts.get(str(response.status_code), 0) + 1
+    return dict(sorted(counts.items())), responses
+
+
+async def run(flood: int, overload: int):
+    async with _env.prepared(users=1):
+        return await measure(flood, overload)
+
+
+async def measure(flood: int, overload: int):
+    import httpx
+    import main
+    import ratelimit
+
+    victim = "user0@example.com"
+
+    def client(ip: str):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app, client=(ip, 40000)), base_url="http://bench")
+
+    async with client("203.0.113.1") as attacker, client("198.51.100.7") as user:
+        before = bcrypt_calls("verify")
+        started = time.perf_counter()
+        flood_statuses, _ = await statuses_of(
+            [attacker.post("/api/auth/login/", json={"email": victim, "password": "wrong"}) for _ in range(flood)]
+        )
+        flood_elapsed = time.perf_counter() - started
+        flood_bcrypt = bcrypt_calls("verify") - before
+        legitimate = await user.post("/api/auth/login/", json={"email": victim, "password": PASSWORD})
+
+    clients = [client(f"192.0.2.{i % 250 + 1}") for i in range(overload)]
+    started = time.perf_counter()
+    overload_statuses, responses = await statuses_of([
+        c.post("/api/auth/registration/", json={"email": f"new{i}@example.com", "username": f"new{i}", "password": "pw"})
+        for i, c in enumerate(clients)
+    ])
+    overload_elapsed = time.perf_counter() - started
+    for c in clients:
+        await c.aclose()
+
+    auth_rule = next((rule for rule in ratelimit.limiter.rules if rule.name == "auth"), None)
+    return {
+        "auth_budget": ratelimit.RATE_LIMIT_AUTH,
+        "max_concurrent_requests": ratelimit.MAX_CONCURRENT_REQUESTS,
+        "admission_queue_size": ratelimit.ADMISSION_QUEUE_SIZE,
+        "flood": {"requests": flood, "statuses": flood_statuses, "bcrypt_calls": flood_bcrypt,
+                  "elapsed_s": round(flood_elapsed, 2)},
+        "other_ip_login": legitimate.status_code,
+        "overload": {"requests": overload, "statuses": overload_statuses, "elapsed_s": round(overload_elapsed, 2),
+                     "retry_after": sorted({r.headers.get("retry-after") for r in responses if r.status_code in (429, 503)} - {None})},
+        "ok": (auth_rule is None or flood_bcrypt <= auth_rule.capacity)
+              and legitimate.status_code == 200
+              and "500" not in flood_statuses and "500" not in overload_statuses,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flood", type=int, default=300)
+    parser.add_argument("--overload", type=int, default=200)
+    args = parser.parse_args()
+
+    _env.configure("ratelimit.db", MAX_CONCURRENT_REQUESTS="16", ADMISSION_QUEUE_SIZE="32", ADMISSION_TIMEOUT="0.5")
+    result = asyncio.run(run(args.flood, args.overload))
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["ok"] else 1)
@@ -0,0 +1,62 @@
+"""Latence de GET /api/properties/search sur un jeu synthétique d'annonces.
+
+Usage : python benchmarks/search_latency.py --rows 100000 --queries 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import _env
+from _env import percentile
+
+WORDS = ["pool", "wifi", "beach", "garden", "parking", "sea", "view", "quiet", "center", "loft",
+         "villa", "studio", "mountain", "lake", "terrace", "balcony", "fireplace", "spa", "gym", "kitchen"]
+# Vocabulaire plus large pour que chaque mot courant ne touche qu'une fraction des annonces
+VOCABULARY = WORDS + ["".join(random.Random(i).choices("abcdefghijklmnopqrstuvwxyz", k=7)) for i in range(3000)]
+QUERIES = ["pool", "wifi", "near beach", "sea view", "quiet garden", "mountain lake spa", "loft center", "terr"]
+
+
+def listing(i: int, rng: random.Random) -> dict:
+    return {"title": f"{rng.choice(VOCABULARY).title()} {rng.choice(VOCABULARY)} {i}",
+            "description": " ".join(rng.choices(VOCABULARY, k=12)),
+            "amenities": ",".join(rng.sample(WORDS, 3))}
+
+
+async def run(rows: int, queries: int):
+    import crud
+    import database
+    import search
+
+    start = time.perf_counter()
+    latencies = []
+    async with _env.prepared(properties=rows, property_fields=listing):
+        seed_s = time.perf_counter() - start
+        async with database.AsyncSessionLocal() as db:
+            for i in range(queries):
+                q = QUERIES[i % len(QUERIES)]
+                start = time.perf_counter()
+                await crud.search_properties(db, q=q, skip=0, limit=20)
+                latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        "backend": search.SEARCH_BACKEND,
+        "rows": rows,
+        "queries": queries,
+        "seed_s": round(seed_s, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    _env.configure()
+    print(json.dumps(asyncio.run(run(args.rows, args.queries)), indent=2))
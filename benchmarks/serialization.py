@@ -0,0 +1,102 @@
+"""Coût par ligne des listes de propriétés (schemas.Property) et de réservations (schemas.BookingDetail).
+
+Usage : python benchmarks/serialization.py --rows 2000 --repeat 5
+
+- avant : objets ORM, validation du response_model puis encodage par le module json (chemin par défaut de FastAPI) ;
+- après : tuples de colonnes rendus en dictionnaires (crud), TypeAdapter construit une fois et dump_json (main.json_list).
+Temps en microsecondes par ligne, lecture SQL et sérialisation séparées (meilleur de --repeat essais).
+Code de sortie 1 si les deux chemins ne produisent pas le même JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import _env
+
+
+def listing(i: int, rng: random.Random) -> dict:
+    return {"description": "Lorem ipsum " * 10, "amenities": "wifi,pool", "latitude": 48.85, "longitude": 2.35}
+
+
+async def measure(fetch, serialize, rows: int, repeat: int):
+    import database
+
+    fetch_s, serialize_s = [], []
+    for _ in range(repeat):
+        async with database.AsyncSessionLocal() as db:
+            start = time.perf_counter()
+            items = await fetch(db)
+            fetch_s.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            body = serialize(items)
+            serialize_s.append(time.perf_counter() - start)
+    return body, {
+        "fetch_us_per_row": round(min(fetch_s) / rows * 1e6, 2),
+        "serialize_us_per_row": round(min(serialize_s) / rows * 1e6, 2),
+        "total_us_per_row": round((min(fetch_s) + min(serialize_s)) / rows * 1e6, 2),
+    }
+
+
+def fastapi_default(adapter):
+    """Ce que fait FastAPI pour un response_model : validation, dump_python(mode="json"), puis JSONResponse"""
+    from fastapi.responses import JSONResponse
+
+    def serialize(items):
+        return JSONResponse(adapter.dump_python(adapter.validate_python(items, from_attributes=True), mode="json")).body
+    return serialize
+
+
+async def _scalars(db, query):
+    return (await db.scalars(query)).all()
+
+
+async def compare(name: str, adapter, before_fetch, after_fetch, rows: int, repeat: int):
+    import main
+
+    before_body, before = await measure(before_fetch, fastapi_default(adapter), rows, repeat)
+    after_body, after = await measure(after_fetch, lambda items: main.json_list(adapter, items).body, rows, repeat)
+    return {
+        "schema": name,
+        "before": before,
+        "after": after,
+        "speedup": round(before["total_us_per_row"] / after["total_us_per_row"], 2),
+        "same_json": json.loads(before_body) == json.loads(after_body),
+    }
+
+
+async def run(rows: int, repeat: int):
+    import crud
+    import main
+
+    # Un seul voyageur : ses réservations (une par propriété) forment la liste de BookingDetail
+    async with _env.prepared(users=1, properties=rows, bookings=rows, property_fields=listing):
+        results = [
+            await compare(
+                "Property", main.property_list_adapter,
+                lambda db: _scalars(db, crud.properties_query(limit=rows)),
+                lambda db: crud.get_properties(db, limit=rows),
+                rows, repeat,
+            ),
+            await compare(
+                "BookingDetail", main.booking_detail_list_adapter,
+                lambda db: _scalars(db, crud.user_bookings_query(1)),
+                lambda db: crud.get_user_bookings(db, 1),
+                rows, repeat,
+            ),
+        ]
+    return {"rows": rows, "repeat": repeat, "results": results, "ok": all(r["same_json"] for r in results)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    _env.configure("serialization.db")
+    result = asyncio.run(run(args.rows, args.repeat))
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["ok"] else 1)
@@ -0,0 +1,120 @@
+"""Écritures concurrentes sur SQLite : aucune erreur "database is locked" attendue.
+
+Usage : python benchmarks/sqlite_stress.py --writers 100 --ops 5 --processes 1
+
+Chaque écrivain crée une réservation, la modifie, ajoute puis retire un favori, `--ops` fois.
+Avec --processes > 1, plusieurs processus (comme des workers gunicorn) écrivent dans le même fichier.
+Code de sortie 1 si une réponse 5xx ou une erreur de verrou est observée.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import _env
+from _env import percentile
+
+BASE_DATE = datetime(2030, 1, 1, 14, tzinfo=timezone.utc)
+
+
+async def writers(process_index: int, count: int, ops: int, properties: int):
+    import httpx
+    import auth
+    import main
+
+    statuses, errors, latencies = {}, [], []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stress") as client:
+
+        async def call(method, url, headers, **kwargs):
+            start = time.perf_counter()
+            response = await client.request(method, url, headers=headers, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code >= 500 or "locked" in response.text:
+                errors.append(response.text[:200])
+            return response
+
+        async def writer(index: int):
+            user_id = process_index * count + index + 1
+            token = auth.create_access_token({"sub": f"user{user_id - 1}@example.com", "uid": user_id, "is_active": True},
+                                             expires_delta=timedelta(minutes=30))
+            headers = {"Authorization": f"Bearer {token}"}
+            for op in range(ops):
+                # Dates propres à chaque écrivain : les seuls conflits possibles sont des conflits de verrou
+                slot = (user_id * ops + op) * 10
+                check_in = BASE_DATE + timedelta(days=slot)
+                booking = await call("POST", "/api/bookings/", headers, json={
+                    "property_id": user_id % properties + 1,
+                    "check_in": check_in.isoformat(), "check_out": (check_in + timedelta(days=2)).isoformat()})
+                if booking.status_code == 201:
+                    await call("PUT", f"/api/bookings/{booking.json()['id']}/", headers, json={
+                        "property_id": user_id % properties + 1,
+                        "check_in": (check_in + timedelta(days=1)).isoformat(), "check_out": (check_in + timedelta(days=4)).isoformat()})
+                favorite = await call("POST", "/api/favorites/", headers, json={"property_id": (user_id + op) % properties + 1})
+                if favorite.status_code == 201:
+                    await call("DELETE", f"/api/favorites/{favorite.json()['id']}/", headers)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(writer(i) for i in range(count)))
+        elapsed = time.perf_counter() - start
+
+    await _env.release()
+    return {"statuses": statuses, "errors": errors, "latencies": latencies, "elapsed": elapsed}
+
+
+def run_process(process_index: int, count: int, ops: int, properties: int, queue):
+    queue.put(asyncio.run(writers(process_index, count, ops, properties)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=100, help="écrivains concurrents par processus")
+    parser.add_argument("--ops", type=int, default=5)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--properties", type=int, default=20)
+    args = parser.parse_args()
+
+    # Mesure de l'application elle-même : tous les clients partagent une IP, la limitation fausserait les résultats
+    _env.configure("stress.db", RATE_LIMIT_ENABLED="false", MAX_CONCURRENT_REQUESTS="0")
+    os.environ["DB_AUTO_INIT"] = "false"
+    _env.setup(users=args.writers * args.processes, properties=args.properties)
+
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    start = time.perf_counter()
+    workers = [context.Process(target=run_process, args=(i, args.writers, args.ops, args.properties, queue))
+               for i in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for result in results:
+        for code, count in result["statuses"].items():
+            statuses[str(code)] = statuses.get(str(code), 0) + count
+    latencies = sorted(value for result in results for value in result["latencies"])
+    errors = [error for result in results for error in result["errors"]]
+    import database
+    report = {
+        "writers": args.writers * args.processes,
+        "processes": args.processes,
+        "requests": len(latencies),
+        "journal_mode": database.SQLITE_JOURNAL_MODE,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "statuses": dict(sorted(statuses.items())),
+        "lock_errors": len(errors),
+        "sample_errors": errors[:3],
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,79 @@
+"""Compare le pic mémoire de GET /api/properties/ en JSON classique et en flux NDJSON.
+
+Usage : python benchmarks/streaming_memory.py --rows 20000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+import _env
+
+
+def listing(i: int, rng: random.Random) -> dict:
+    return {"title": f"Listing {i}", "description": "Lorem ipsum " * 10, "amenities": "wifi,pool"}
+
+
+async def call(app, path: str, query: str):
+    """Appelle l'application ASGI et jette le corps au fil de l'eau (aucun tampon côté client)"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query.encode(), "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    sent_request = False
+    disconnected = asyncio.Event()
+    size = 0
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return size
+
+
+async def measure(app, query: str):
+    import response_cache
+
+    response_cache.property_lists.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = await call(app, "/api/properties/", query)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"bytes": size, "elapsed_s": round(elapsed, 3), "peak_mb": round(peak / 1024 / 1024, 2)}
+
+
+async def run(rows: int):
+    import main
+
+    async with _env.prepared(properties=rows, property_fields=listing):
+        return {
+            "rows": rows,
+            "json": await measure(main.app, f"limit={rows}"),
+            "ndjson": await measure(main.app, f"limit={rows}&stream=true"),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    _env.configure()
+    print(json.dumps(asyncio.run(run(args.rows)), indent=2))
@@ -0,0 +1,157 @@
+"""Suite de benchmarks de l'API : base SQLite peuplée puis scénarios concurrents en processus (ASGI).
+
+Usage : python benchmarks/suite.py --users 1000 --properties 5000 --bookings 20000 --favorites 5000 \
+            --requests 500 --concurrency 32 --output bench.json [--compare ancien.json]
+
+Le JSON produit (débit, p50/p95/p99 par scénario, commit git) peut être comparé entre deux commits avec --compare.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import timedelta
+
+import _env
+from _env import BASE_DATE, CITIES, PASSWORD, ROOT, percentile
+
+SCENARIOS = ("register", "login", "browse", "book", "favorite")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_scenario(operation, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            status_code = await operation(i)
+            latencies.append(time.perf_counter() - start)
+            statuses[status_code] = statuses.get(status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def run(args):
+    import httpx
+    import hashing
+    import main
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with _env.prepared(users=args.users, properties=args.properties, bookings=args.bookings,
+                             favorites=args.favorites, rng=rng), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        seed_s = time.perf_counter() - start
+        tokens = []
+        for i in range(min(args.users, args.concurrency)):
+            response = await client.post("/api/auth/login/", json={"email": f"user{i}@example.com", "password": PASSWORD})
+            tokens.append({"Authorization": f"Bearer {response.json()['access_token']}"})
+
+        async def register(i):
+            response = await client.post("/api/auth/registration/", json={
+                "email": f"new{i}@example.com", "username": f"new{i}", "password": PASSWORD})
+            return response.status_code
+
+        async def login(i):
+            response = await client.post("/api/auth/login/", json={"email": f"user{i % args.users}@example.com", "password": PASSWORD})
+            return response.status_code
+
+        async def browse(i):
+            # Une page filtrée, la page suivante par curseur, puis une fiche détaillée
+            response = await client.get("/api/properties/", params={"city": CITIES[i % len(CITIES)], "limit": 20})
+            cursor = response.headers.get("x-next-cursor")
+            if cursor:
+                await client.get("/api/properties/", params={"city": CITIES[i % len(CITIES)], "limit": 20, "cursor": cursor})
+            response = await client.get(f"/api/properties/{rng.randint(1, args.properties)}/")
+            return response.status_code
+
+        async def book(i):
+            # Dates au-delà des réservations peuplées, une semaine par opération
+            check_in = BASE_DATE + timedelta(days=3650 + 7 * i)
+            response = await client.post("/api/bookings/", headers=tokens[i % len(tokens)], json={
+                "property_id": rng.randint(1, args.properties),
+                "check_in": check_in.isoformat(), "check_out": (check_in + timedelta(days=2)).isoformat()})
+            return response.status_code
+
+        async def favorite(i):
+            headers = tokens[i % len(tokens)]
+            response = await client.post("/api/favorites/", headers=headers, json={"property_id": rng.randint(1, args.properties)})
+            await client.get("/api/favorites/", headers=headers)
+            return response.status_code
+
+        operations = {"register": register, "login": login, "browse": browse, "book": book, "favorite": favorite}
+        for name in args.scenarios:
+            results[name] = await run_scenario(operations[name], args.requests, args.concurrency)
+
+    return {
+        "commit": git_commit(),
+        "config": {
+            "users": args.users, "properties": args.properties, "bookings": args.bookings, "favorites": args.favorites,
+            "requests": args.requests, "concurrency": args.concurrency, "bcrypt_rounds": hashing.BCRYPT_ROUNDS,
+        },
+        "seed_s": round(seed_s, 2),
+        "scenarios": results,
+    }
+
+
+def compare(current, previous):
+    """Écart relatif (en %) du débit et des percentiles par rapport à un résultat précédent"""
+    deltas = {}
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        deltas[name] = {
+            key: round((result[key] - before[key]) / before[key] * 100, 1) if before[key] else None
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+        }
+    return {"baseline": previous.get("commit"), "change_pct": deltas}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--properties", type=int, default=5000)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--favorites", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON où écrire le résultat")
+    parser.add_argument("--compare", help="résultat JSON d'un commit précédent")
+    args = parser.parse_args()
+
+    # Mesure de l'application elle-même : tous les clients partagent une IP, la limitation fausserait les résultats
+    _env.configure(RATE_LIMIT_ENABLED="false", MAX_CONCURRENT_REQUESTS="0")
+    result = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as f:
+            result["comparison"] = compare(result, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,26 @@
+import os
+import amenities
+import migrations
+import models
+import search
+import stats
+from database import engine
+
+
+def auto_init() -> bool:
+    """Initialisation au démarrage de l'application ; désactivée sous gunicorn, où le maître s'en charge"""
+    return os.getenv("DB_AUTO_INIT", "true").lower() in ("1", "true", "yes")
+
+
+def init_db():
+    """Crée le schéma, applique les migrations et les index annexes, puis reprend les anciennes données (idempotent)"""
+    models.Base.metadata.create_all(bind=engine)
+    migrations.migrate()
+    amenities.backfill()
+    stats.backfill()
+    search.create_index()
+
+
+if __name__ == "__main__":
+    # Étape explicite de déploiement : python bootstrap.py
+    init_db()
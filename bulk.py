@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud
+import models
+import schemas
+import streaming
+from database import AsyncSessionLocal
+
+# Import/export en masse des propriétés
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 500))
+BULK_MAX_ERRORS = int(os.getenv("BULK_MAX_ERRORS", 1000))
+EXPORT_FIELDS = list(schemas.Property.model_fields)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Découpe un flux d'octets en lignes numérotées, sans charger tout le corps"""
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield line_no + 1, buffer.decode("utf-8").rstrip("\r")
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    async for line_no, line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as exc:
+            yield line_no, exc
+
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    header: Optional[List[str]] = None
+    record, start = "", 0
+    async for line_no, line in iter_lines(chunks):
+        record = f"{record}\n{line}" if record else line
+        start = start or line_no
+        # Un nombre impair de guillemets signifie qu'un champ continue sur la ligne suivante
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record])) if record.strip() else []
+        record_start, record, start = start, "", 0
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield record_start, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        # Les cellules vides prennent la valeur par défaut du schéma
+        yield record_start, {name: value for name, value in zip(header, values) if value != ""}
+    if record:
+        yield start, ValueError("Unterminated quoted field")
+
+
+def _row_errors(exc: Exception) -> List[Dict]:
+    if isinstance(exc, ValidationError):
+        return [{"loc": list(error["loc"]), "msg": error["msg"]} for error in exc.errors(include_url=False)]
+    return [{"loc": [], "msg": str(exc)}]
+
+
+async def import_properties(db: AsyncSession, rows: AsyncIterator[Tuple[int, object]], owner_id: int) -> schemas.BulkImportReport:
+    created, failed = 0, 0
+    errors: List[schemas.BulkImportError] = []
+    batch: List[schemas.PropertyCreate] = []
+
+    async for line_no, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            if not isinstance(row, dict):
+                raise ValueError("Each row must be an object")
+            batch.append(schemas.PropertyCreate.model_validate(row))
+        except (ValidationError, ValueError) as exc:
+            failed += 1
+            if len(errors) < BULK_MAX_ERRORS:
+                errors.append(schemas.BulkImportError(line=line_no, errors=_row_errors(exc)))
+            continue
+        if len(batch) >= BULK_BATCH_SIZE:
+            created += await crud.bulk_create_properties(db, batch, owner_id)
+            batch = []
+
+    if batch:
+        created += await crud.bulk_create_properties(db, batch, owner_id)
+    return schemas.BulkImportReport(created=created, failed=failed, errors=errors)
+
+
+async def export_properties(owner_id: int, format: str = "ndjson") -> AsyncIterator[bytes]:
+    """Parcourt les propriétés avec un curseur côté serveur et produit le fichier ligne par ligne"""
+    query = select(models.Property).where(models.Property.owner_id == owner_id).order_by(models.Property.id)
+    if format != "csv":
+        async for chunk in streaming.iter_ndjson(query, schemas.Property):
+            yield chunk
+        return
+
+    # Session propre au flux : elle doit rester ouverte pendant l'envoi de la réponse
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=BULK_BATCH_SIZE))
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        async for partition in result.partitions():
+            for db_property in partition:
+                row = schemas.Property.model_validate(db_property).model_dump(mode="json")
+                row["amenities"] = ",".join(row["amenities"])
+                writer.writerow(row)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
@@ -1,22 +1,57 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, delete, exists, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 import models
 import schemas
-from auth import get_password_hash
+import amenities as amenity_utils
+import geo
+import hashing
+import jobs
+import pricing
+import response_cache
+import search
+import stats
+from database import insert_ignore
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import base64
+
+# Listes en lecture seule : tuples des colonnes du schéma de réponse plutôt qu'objets ORM
+# (ni identity map ni suivi des modifications), rendus sous forme de dictionnaires, que pydantic valide
+# bien plus vite que des objets lus attribut par attribut
+def _columns(model, schema):
+    table = model.__table__
+    return tuple(table.c[name] for name in schema.model_fields if name in table.c)
+
+def _records(rows, columns) -> List[dict]:
+    keys = [column.key for column in columns]
+    return [dict(zip(keys, row)) for row in rows]
+
+PROPERTY_COLUMNS = _columns(models.Property, schemas.Property)
+BOOKING_COLUMNS = _columns(models.Booking, schemas.Booking)
+USER_COLUMNS = _columns(models.User, schemas.User)
+FAVORITE_COLUMNS = _columns(models.Favorite, schemas.Favorite)
 
 # User CRUD
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.scalar(select(models.User).where(models.User.id == user_id))
+
+async def get_user_detail(db: AsyncSession, user_id: int):
+    # Charge les relations de schemas.UserDetail en une requête par collection
+    return await db.scalar(select(models.User).options(
+        selectinload(models.User.properties),
+        selectinload(models.User.bookings),
+        selectinload(models.User.favorites),
+    ).where(models.User.id == user_id))
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(models.User).where(models.User.email == email))
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(models.User).offset(skip).limit(limit))).all()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await hashing.hash_password(user.password)
     db_user = models.User(
         email=user.email,
         username=user.username,
@@ -26,74 +61,273 @@ def create_user(db: Session, user: schemas.UserCreate):
         phone=user.phone
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 # Property CRUD
-def get_property(db: Session, property_id: int):
-    return db.query(models.Property).filter(models.Property.id == property_id).first()
+async def get_property(db: AsyncSession, property_id: int):
+    return await db.scalar(select(models.Property).where(models.Property.id == property_id))
+
+async def get_property_detail(db: AsyncSession, property_id: int):
+    # Charge les relations de schemas.PropertyDetail avec la propriété
+    return await db.scalar(select(models.Property).options(
+        joinedload(models.Property.owner),
+        selectinload(models.Property.bookings),
+    ).where(models.Property.id == property_id))
+
+def encode_cursor(created_at: datetime, property_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{property_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, property_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(property_id)
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+def properties_query(
+    skip: int = 0,
+    limit: int = 100,
+    city: Optional[str] = None,
+    country: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_capacity: Optional[int] = None,
+    min_bedrooms: Optional[int] = None,
+    is_available: Optional[bool] = None,
+    amenities: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+):
+    query = select(models.Property)
+    if city is not None:
+        query = query.where(models.Property.city == city)
+    if country is not None:
+        query = query.where(models.Property.country == country)
+    if min_price is not None:
+        query = query.where(models.Property.price_per_night >= min_price)
+    if max_price is not None:
+        query = query.where(models.Property.price_per_night <= max_price)
+    if min_capacity is not None:
+        query = query.where(models.Property.capacity >= min_capacity)
+    if min_bedrooms is not None:
+        query = query.where(models.Property.bedrooms >= min_bedrooms)
+    if is_available is not None:
+        query = query.where(models.Property.is_available == is_available)
+    if amenities:
+        query = query.where(amenity_utils.having_all(amenity_utils.normalize(amenities)))
 
-def get_properties(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Property).offset(skip).limit(limit).all()
+    query = query.order_by(models.Property.created_at, models.Property.id)
 
-def create_property(db: Session, property: schemas.PropertyCreate, owner_id: int):
-    db_property = models.Property(**property.dict(), owner_id=owner_id)
+    # Pagination par curseur (keyset) : reprend juste après le dernier (created_at, id) vu
+    if cursor is not None:
+        created_at, property_id = decode_cursor(cursor)
+        query = query.where(or_(
+            models.Property.created_at > created_at,
+            and_(models.Property.created_at == created_at, models.Property.id > property_id),
+        ))
+    else:
+        query = query.offset(skip)
+
+    return query.limit(limit)
+
+async def get_properties(db: AsyncSession, **filters):
+    return _records(await db.execute(properties_query(**filters).with_only_columns(*PROPERTY_COLUMNS)), PROPERTY_COLUMNS)
+
+def _property_values(property: schemas.PropertyCreate):
+    # Les équipements sont stockés dans property_amenities et recopiés en texte dans la colonne
+    values = property.dict()
+    values["amenities"] = amenity_utils.to_text(values["amenities"])
+    has_position = values["latitude"] is not None and values["longitude"] is not None
+    values["geohash"] = geo.encode(values["latitude"], values["longitude"]) if has_position else None
+    return values
+
+async def create_property(db: AsyncSession, property: schemas.PropertyCreate, owner_id: int):
+    db_property = models.Property(**_property_values(property), owner_id=owner_id)
     db.add(db_property)
-    db.commit()
-    db.refresh(db_property)
+    await db.flush()
+    await amenity_utils.set_amenities(db, {db_property.id: property.amenities})
+    # Indexation plein texte en tâche de fond ; l'objet est déjà complet (pas de refresh après le commit)
+    await jobs.enqueue(db, "search.index", property_ids=[db_property.id])
+    await response_cache.bump_lists(db)
+    await db.commit()
+    response_cache.invalidate_property(db_property.id)
     return db_property
 
-def update_property(db: Session, property_id: int, property_update: schemas.PropertyCreate, owner_id: int):
-    db_property = db.query(models.Property).filter(
+async def bulk_create_properties(db: AsyncSession, properties: List[schemas.PropertyCreate], owner_id: int):
+    # Un seul INSERT multi-lignes et un seul commit par lot
+    db_properties = (await db.scalars(
+        insert(models.Property).returning(models.Property, sort_by_parameter_order=True),
+        [{**_property_values(property), "owner_id": owner_id} for property in properties],
+    )).all()
+    await amenity_utils.set_amenities(db, {
+        db_property.id: property.amenities for db_property, property in zip(db_properties, properties)
+    })
+    await jobs.enqueue(db, "search.index", property_ids=[db_property.id for db_property in db_properties])
+    await response_cache.bump_lists(db)
+    await db.commit()
+    response_cache.invalidate_property_lists()
+    return len(properties)
+
+async def update_property(db: AsyncSession, property_id: int, property_update: schemas.PropertyCreate, owner_id: int):
+    db_property = await db.scalar(select(models.Property).where(
         models.Property.id == property_id,
         models.Property.owner_id == owner_id
-    ).first()
+    ))
     if not db_property:
         return None
-    
-    for key, value in property_update.dict().items():
+
+    for key, value in _property_values(property_update).items():
         setattr(db_property, key, value)
-    
-    db.commit()
-    db.refresh(db_property)
+
+    await amenity_utils.set_amenities(db, {property_id: property_update.amenities})
+    await jobs.enqueue(db, "search.index", property_ids=[property_id])
+    await response_cache.bump_lists(db)
+    await response_cache.bump_detail(db, property_id)
+    await db.commit()
+    response_cache.invalidate_property(property_id)
     return db_property
 
-def delete_property(db: Session, property_id: int, owner_id: int):
-    db_property = db.query(models.Property).filter(
+async def delete_property(db: AsyncSession, property_id: int, owner_id: int):
+    db_property = await db.scalar(select(models.Property).where(
         models.Property.id == property_id,
         models.Property.owner_id == owner_id
-    ).first()
+    ))
     if not db_property:
         return False
-    
-    db.delete(db_property)
-    db.commit()
+
+    await db.delete(db_property)
+    await amenity_utils.remove_amenities(db, [property_id])
+    await stats.remove_properties(db, [property_id])
+    await db.execute(delete(models.PriceRule).where(models.PriceRule.property_id == property_id))
+    await search.backend.remove(db, [property_id])
+    await response_cache.bump_lists(db)
+    await db.commit()
+    response_cache.invalidate_property(property_id)
+    pricing.invalidate(property_id)
     return True
 
-def get_user_properties(db: Session, owner_id: int):
-    return db.query(models.Property).filter(models.Property.owner_id == owner_id).all()
+async def get_price_rules(db: AsyncSession, property_id: int):
+    return (await db.scalars(select(models.PriceRule).where(models.PriceRule.property_id == property_id).order_by(
+        models.PriceRule.priority, models.PriceRule.id
+    ))).all()
+
+async def create_price_rule(db: AsyncSession, property_id: int, rule: schemas.PriceRuleCreate, owner_id: int):
+    db_property = await db.scalar(select(models.Property).where(
+        models.Property.id == property_id,
+        models.Property.owner_id == owner_id
+    ))
+    if not db_property:
+        return None
+
+    db_rule = models.PriceRule(**{**rule.model_dump(), "weekdays": pricing.weekday_mask(rule.weekdays)}, property_id=property_id)
+    db.add(db_rule)
+    await pricing.rules_changed(db, property_id)
+    await db.commit()
+    pricing.invalidate(property_id)
+    return db_rule
+
+async def delete_price_rule(db: AsyncSession, property_id: int, rule_id: int, owner_id: int):
+    db_rule = await db.scalar(select(models.PriceRule).join(models.Property).where(
+        models.PriceRule.id == rule_id,
+        models.PriceRule.property_id == property_id,
+        models.Property.owner_id == owner_id
+    ))
+    if not db_rule:
+        return False
+
+    await db.delete(db_rule)
+    await pricing.rules_changed(db, property_id)
+    await db.commit()
+    pricing.invalidate(property_id)
+    return True
+
+async def get_nearby_properties(db: AsyncSession, latitude: float, longitude: float, radius_km: float, limit: int = 50):
+    box = geo.bounding_box(latitude, longitude, radius_km)
+    lat_min, lat_max, lon_min, lon_max = box
+    # Préfiltre : plages de géohash (index) puis boîte englobante, distance exacte ensuite
+    cells = or_(*(
+        and_(models.Property.geohash >= cell, models.Property.geohash < geo.prefix_upper_bound(cell))
+        for cell in geo.covering_cells(box)
+    ))
+    in_longitude = models.Property.longitude.between(lon_min, lon_max) if lon_min <= lon_max else or_(
+        models.Property.longitude >= lon_min, models.Property.longitude <= lon_max
+    )
+    candidates = (await db.scalars(select(models.Property).where(
+        cells, models.Property.latitude.between(lat_min, lat_max), in_longitude
+    ))).all()
+
+    nearby = []
+    for db_property in candidates:
+        distance = geo.haversine_km(latitude, longitude, db_property.latitude, db_property.longitude)
+        if distance <= radius_km:
+            nearby.append((distance, db_property))
+    nearby.sort(key=lambda item: (item[0], item[1].id))
+    return nearby[:limit]
+
+async def search_properties(db: AsyncSession, q: str, skip: int = 0, limit: int = 20):
+    if not search.tokenize(q):
+        return []
+    return (await db.scalars(search.backend.query(q).offset(skip).limit(limit))).all()
+
+async def get_user_properties(db: AsyncSession, owner_id: int):
+    return (await db.scalars(select(models.Property).where(models.Property.owner_id == owner_id))).all()
 
 # Booking CRUD
-def get_booking(db: Session, booking_id: int):
-    return db.query(models.Booking).filter(models.Booking.id == booking_id).first()
+class BookingConflict(Exception):
+    pass
+
+def _overlapping_bookings(property_id, check_in: datetime, check_out: datetime):
+    # Deux séjours se chevauchent si chacun commence avant la fin de l'autre
+    return and_(
+        models.Booking.property_id == property_id,
+        models.Booking.check_in < check_out,
+        models.Booking.check_out > check_in,
+        models.Booking.status != "cancelled",
+    )
+
+async def has_booking_conflict(db: AsyncSession, property_id: int, check_in: datetime, check_out: datetime, exclude_booking_id: Optional[int] = None):
+    condition = _overlapping_bookings(property_id, check_in, check_out)
+    if exclude_booking_id is not None:
+        condition = and_(condition, models.Booking.id != exclude_booking_id)
+    return await db.scalar(select(exists().where(condition)))
+
+async def _lock_property(db: AsyncSession, property_id: int):
+    # Ligne verrouillée jusqu'à la fin de la transaction : sous PostgreSQL (READ COMMITTED), deux réservations
+    # concurrentes de la même propriété passent l'une après l'autre par la vérification de chevauchement.
+    # SQLite ignore FOR UPDATE ; l'écrivain unique (BEGIN IMMEDIATE) y sérialise déjà les écritures
+    return await db.scalar(select(models.Property).where(models.Property.id == property_id).with_for_update())
+
+async def get_available_properties(db: AsyncSession, check_in: datetime, check_out: datetime, skip: int = 0, limit: int = 100):
+    booked = exists().where(_overlapping_bookings(models.Property.id, check_in, check_out))
+    return _records(await db.execute(select(*PROPERTY_COLUMNS).where(
+        models.Property.is_available == True,
+        ~booked
+    ).order_by(models.Property.id).offset(skip).limit(limit)), PROPERTY_COLUMNS)
+
+def _booking_detail_options():
+    # Relations sérialisées par schemas.BookingDetail
+    return (joinedload(models.Booking.property), joinedload(models.Booking.user))
 
-def get_bookings(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Booking).offset(skip).limit(limit).all()
+async def get_booking(db: AsyncSession, booking_id: int):
+    return await db.scalar(select(models.Booking).options(*_booking_detail_options()).where(models.Booking.id == booking_id))
 
-def create_booking(db: Session, booking: schemas.BookingCreate, user_id: int):
-    # Calculate total price
-    property = get_property(db, booking.property_id)
+async def get_bookings(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(models.Booking).offset(skip).limit(limit))).all()
+
+async def create_booking(db: AsyncSession, booking: schemas.BookingCreate, user_id: int):
+    property = await _lock_property(db, booking.property_id)
     if not property:
         return None
-    
-    # Calculate number of days
-    days = (booking.check_out - booking.check_in).days
-    if days <= 0:
-        days = 1
-    
-    total_price = days * property.price_per_night
-    
+
+    if await has_booking_conflict(db, booking.property_id, booking.check_in, booking.check_out):
+        raise BookingConflict("Property is already booked for these dates")
+
+    # Prix des nuits d'après le calendrier de la propriété (règles saisonnières incluses)
+    _, total_price = await pricing.quote(db, property, booking.check_in, booking.check_out)
+
     db_booking = models.Booking(
         **booking.dict(),
         user_id=user_id,
@@ -101,77 +335,140 @@ def create_booking(db: Session, booking: schemas.BookingCreate, user_id: int):
         status="pending"
     )
     db.add(db_booking)
-    db.commit()
-    db.refresh(db_booking)
+    await stats.add_booking(db, db_booking)
+    await response_cache.bump_detail(db, db_booking.property_id)
+    await db.commit()
+    response_cache.invalidate_property_detail(db_booking.property_id)
     return db_booking
 
-def update_booking(db: Session, booking_id: int, booking_update: schemas.BookingCreate, user_id: int):
-    db_booking = db.query(models.Booking).filter(
+async def update_booking(db: AsyncSession, booking_id: int, booking_update: schemas.BookingCreate, user_id: int):
+    db_booking = await db.scalar(select(models.Booking).where(
         models.Booking.id == booking_id,
         models.Booking.user_id == user_id
-    ).first()
+    ))
     if not db_booking:
         return None
-    
-    # Recalculate price if dates changed
-    if booking_update.check_in or booking_update.check_out:
-        property = get_property(db, db_booking.property_id)
-        days = (booking_update.check_out - booking_update.check_in).days
-        db_booking.total_price = days * property.price_per_night
-    
+
+    property = await _lock_property(db, booking_update.property_id)
+    if not property:
+        return None
+
+    if await has_booking_conflict(db, booking_update.property_id, booking_update.check_in, booking_update.check_out, exclude_booking_id=booking_id):
+        raise BookingConflict("Property is already booked for these dates")
+
+    # Part de l'ancienne réservation retirée avant la modification des dates et du prix
+    previous_property_id = db_booking.property_id
+    await stats.remove_booking(db, db_booking)
+
+    # Prix recalculé pour la propriété et les dates demandées
+    _, db_booking.total_price = await pricing.quote(db, property, booking_update.check_in, booking_update.check_out)
     for key, value in booking_update.dict().items():
         setattr(db_booking, key, value)
-    
-    db.commit()
-    db.refresh(db_booking)
+    await stats.add_booking(db, db_booking)
+
+    for property_id in sorted({previous_property_id, db_booking.property_id}):
+        await response_cache.bump_detail(db, property_id)
+    await db.commit()
+    response_cache.invalidate_property_detail(previous_property_id)
+    response_cache.invalidate_property_detail(db_booking.property_id)
     return db_booking
 
-def delete_booking(db: Session, booking_id: int, user_id: int):
-    db_booking = db.query(models.Booking).filter(
+async def delete_booking(db: AsyncSession, booking_id: int, user_id: int):
+    db_booking = await db.scalar(select(models.Booking).where(
         models.Booking.id == booking_id,
         models.Booking.user_id == user_id
-    ).first()
+    ))
     if not db_booking:
         return False
-    
-    db.delete(db_booking)
-    db.commit()
+
+    await db.delete(db_booking)
+    await stats.remove_booking(db, db_booking)
+    await response_cache.bump_detail(db, db_booking.property_id)
+    await db.commit()
+    response_cache.invalidate_property_detail(db_booking.property_id)
     return True
 
-def get_user_bookings(db: Session, user_id: int):
-    return db.query(models.Booking).filter(models.Booking.user_id == user_id).all()
+def user_bookings_query(user_id: int):
+    return select(models.Booking).options(*_booking_detail_options()).where(models.Booking.user_id == user_id)
+
+async def get_user_bookings(db: AsyncSession, user_id: int):
+    # Réservation, propriété et voyageur sur une même ligne, remis en forme pour schemas.BookingDetail
+    rows = await db.execute(
+        select(*BOOKING_COLUMNS, *PROPERTY_COLUMNS, *USER_COLUMNS)
+        .join(models.Property, models.Property.id == models.Booking.property_id)
+        .join(models.User, models.User.id == models.Booking.user_id)
+        .where(models.Booking.user_id == user_id)
+    )
+    booking_keys = [column.key for column in BOOKING_COLUMNS]
+    property_keys = [column.key for column in PROPERTY_COLUMNS]
+    user_keys = [column.key for column in USER_COLUMNS]
+    split = len(booking_keys) + len(property_keys)
+    return [
+        {
+            **dict(zip(booking_keys, row)),
+            "property": dict(zip(property_keys, row[len(booking_keys):split])),
+            "user": dict(zip(user_keys, row[split:])),
+        }
+        for row in rows
+    ]
 
 # Favorite CRUD
-def get_favorite(db: Session, favorite_id: int):
-    return db.query(models.Favorite).filter(models.Favorite.id == favorite_id).first()
+async def get_favorite(db: AsyncSession, favorite_id: int):
+    return await db.scalar(select(models.Favorite).where(models.Favorite.id == favorite_id))
+
+def favorites_query(user_id: int):
+    return select(models.Favorite).where(models.Favorite.user_id == user_id)
 
-def get_favorites(db: Session, user_id: int):
-    return db.query(models.Favorite).filter(models.Favorite.user_id == user_id).all()
+async def get_favorites(db: AsyncSession, user_id: int):
+    return _records(await db.execute(favorites_query(user_id).with_only_columns(*FAVORITE_COLUMNS)), FAVORITE_COLUMNS)
 
-def create_favorite(db: Session, favorite: schemas.FavoriteCreate, user_id: int):
-    # Check if already favorited
-    existing = db.query(models.Favorite).filter(
+async def get_favorite_property_ids(db: AsyncSession, user_id: int):
+    return (await db.scalars(
+        select(models.Favorite.property_id).where(models.Favorite.user_id == user_id).order_by(models.Favorite.property_id)
+    )).all()
+
+async def create_favorite(db: AsyncSession, favorite: schemas.FavoriteCreate, user_id: int):
+    # INSERT ... ON CONFLICT DO NOTHING : deux requêtes simultanées ne violent plus unique_user_property
+    await db.execute(insert_ignore(models.Favorite.__table__).values(user_id=user_id, property_id=favorite.property_id))
+    db_favorite = await db.scalar(select(models.Favorite).where(
         models.Favorite.user_id == user_id,
         models.Favorite.property_id == favorite.property_id
-    ).first()
-    
-    if existing:
-        return existing
-    
-    db_favorite = models.Favorite(**favorite.dict(), user_id=user_id)
-    db.add(db_favorite)
-    db.commit()
-    db.refresh(db_favorite)
+    ))
+    await db.commit()
     return db_favorite
 
-def delete_favorite(db: Session, favorite_id: int, user_id: int):
-    db_favorite = db.query(models.Favorite).filter(
+async def add_favorites(db: AsyncSession, property_ids: List[int], user_id: int):
+    """Ajoute plusieurs favoris dans une seule transaction ; renvoie (ajoutés, propriétés inexistantes)"""
+    requested = list(dict.fromkeys(property_ids))
+    found = set((await db.scalars(select(models.Property.id).where(models.Property.id.in_(requested)))).all())
+    already = set((await db.scalars(select(models.Favorite.property_id).where(
+        models.Favorite.user_id == user_id,
+        models.Favorite.property_id.in_(found)
+    ))).all())
+    new_ids = [property_id for property_id in requested if property_id in found and property_id not in already]
+    if new_ids:
+        await db.execute(insert_ignore(models.Favorite.__table__), [
+            {"user_id": user_id, "property_id": property_id} for property_id in new_ids
+        ])
+    await db.commit()
+    return len(new_ids), [property_id for property_id in requested if property_id not in found]
+
+async def remove_favorites(db: AsyncSession, property_ids: List[int], user_id: int):
+    result = await db.execute(delete(models.Favorite).where(
+        models.Favorite.user_id == user_id,
+        models.Favorite.property_id.in_(set(property_ids))
+    ))
+    await db.commit()
+    return result.rowcount
+
+async def delete_favorite(db: AsyncSession, favorite_id: int, user_id: int):
+    db_favorite = await db.scalar(select(models.Favorite).where(
         models.Favorite.id == favorite_id,
         models.Favorite.user_id == user_id
-    ).first()
+    ))
     if not db_favorite:
         return False
-    
-    db.delete(db_favorite)
-    db.commit()
-    return True
\ No newline at end of file
+
+    await db.delete(db_favorite)
+    await db.commit()
+    return True
@@ -1,18 +1,157 @@
 import os
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from dotenv import load_dotenv
+
+# Premier module chargé qui lit l'environnement : le fichier .env est lu ici, une seule fois
+load_dotenv()
 
 # Stocker la base dans /tmp, qui est accessible en écriture sur Render
 DB_FILE = os.path.join("/tmp", "property.db")
-DATABASE_URL = f"sqlite:///{DB_FILE}"
+DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{DB_FILE}"
+# Render fournit des URLs "postgres://", que SQLAlchemy ne reconnaît plus
+if DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+# Pilotes asynchrones utilisés pour chaque base
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+_url = make_url(DATABASE_URL)
+_backend = _url.get_backend_name()
+SYNC_DATABASE_URL = _url.set(drivername=_backend)
+ASYNC_DATABASE_URL = _url.set(drivername=f"{_backend}+{ASYNC_DRIVERS[_backend]}") if _backend in ASYNC_DRIVERS else _url
+
+# Réglages du pool de connexions
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Profil SQLite appliqué à chaque connexion (journal WAL, synchronisation, attente sur verrou, mmap, cache)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))  # millisecondes
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", -64000))  # négatif : taille en Kio
+SQLITE_READ_ONLY_POOL = os.getenv("SQLITE_READ_ONLY_POOL", "true").lower() in ("1", "true", "yes")
+
+# Base SQLite dans un fichier : le mode WAL et la séparation lecture/écriture ne s'appliquent pas en mémoire
+_sqlite_file = _backend == "sqlite" and _url.database not in (None, "", ":memory:") and not _url.database.startswith("file:")
+
+connect_args = {"check_same_thread": False} if _backend == "sqlite" else {}
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def _pool_options(url, **overrides):
+    """Réglages du pool pour cette URL : taille, débordement et attente n'existent que pour un QueuePool
+    (SQLite en mémoire utilise un pool à connexion unique, qui les refuse)"""
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        return {**pool_options, **overrides}
+    return {"pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": DB_POOL_PRE_PING}
+
+
+def _apply_sqlite_profile(target, read_only: bool = False, immediate: bool = False):
+    @event.listens_for(target, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.close()
+        if immediate:
+            # Transactions gérées par SQLAlchemy (événement "begin" ci-dessous) plutôt que par le pilote
+            dbapi_connection.isolation_level = None
+
+    if immediate:
+        @event.listens_for(target, "begin")
+        def _on_begin(conn):
+            # Le verrou d'écriture est pris dès le début : pas d'échec "database is locked" lors de la promotion
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+engine = create_engine(SYNC_DATABASE_URL, connect_args=connect_args, **_pool_options(SYNC_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+if _sqlite_file:
+    _apply_sqlite_profile(engine)
+    # Un seul écrivain par processus : les sessions d'écriture attendent leur tour dans la file du pool
+    write_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL, pool_size=1, max_overflow=0))
+    _apply_sqlite_profile(write_engine.sync_engine, immediate=True)
+    if SQLITE_READ_ONLY_POOL:
+        _read_url = ASYNC_DATABASE_URL.set(database=f"file:{_url.database}", query={**_url.query, "mode": "ro", "uri": "true"})
+        async_engine = create_async_engine(_read_url, **_pool_options(_read_url))
+        _apply_sqlite_profile(async_engine.sync_engine, read_only=True)
+    else:
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL))
+        _apply_sqlite_profile(async_engine.sync_engine)
+else:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL))
+    write_engine = async_engine
+
+# Sessions de lecture (pool en lecture seule sur SQLite) et d'écriture
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncWriteSessionLocal = async_sessionmaker(write_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_write_db():
+    """Session pour les endpoints qui modifient la base"""
+    async with AsyncWriteSessionLocal() as db:
+        yield db
+
+
+def engines():
+    """Moteurs distincts de l'application (synchrone, lecture, écriture)"""
+    return list(dict.fromkeys([engine, async_engine.sync_engine, write_engine.sync_engine]))
+
+
+def insert_ignore(table):
+    """INSERT ... ON CONFLICT DO NOTHING pour SQLite et PostgreSQL"""
+    if _backend == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table).on_conflict_do_nothing()
+
+
+@contextmanager
+def count_queries(bind=None):
+    """Compte les requêtes SQL exécutées sur le moteur pendant le bloc (utile pour détecter les N+1)"""
+    binds = [bind] if bind is not None else engines()
+    counter = {"count": 0}
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter["count"] += 1
+
+    for target in binds:
+        event.listen(target, "before_cursor_execute", _count)
+    try:
+        yield counter
+    finally:
+        for target in binds:
+            event.remove(target, "before_cursor_execute", _count)
@@ -0,0 +1,89 @@
+import math
+from typing import List, Set, Tuple
+
+# Géohash : préfixe commun = cellule commune, ce qui permet une recherche par plage d'index
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+# Nombre maximal de cellules interrogées pour couvrir la zone de recherche
+MAX_CELLS = 16
+
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Hauteur et largeur (en degrés) d'une cellule de la précision donnée"""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(lat_min, lat_max, lon_min, lon_max) ; lon_min > lon_max si la zone traverse l'antiméridien"""
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    lat_min, lat_max = max(-90.0, latitude - d_lat), min(90.0, latitude + d_lat)
+    if lat_min <= -90.0 or lat_max >= 90.0:
+        return lat_min, lat_max, -180.0, 180.0
+    d_lon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(latitude))))
+    if d_lon >= 180.0:
+        return lat_min, lat_max, -180.0, 180.0
+    return lat_min, lat_max, _wrap(longitude - d_lon), _wrap(longitude + d_lon)
+
+
+def _wrap(longitude: float) -> float:
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def _lon_span(lon_min: float, lon_max: float) -> float:
+    return lon_max - lon_min if lon_min <= lon_max else 360.0 - lon_min + lon_max
+
+
+def covering_cells(box: Tuple[float, float, float, float]) -> List[str]:
+    """Plus petit ensemble de préfixes géohash (au plus MAX_CELLS) recouvrant la zone"""
+    lat_min, lat_max, lon_min, lon_max = box
+    span = _lon_span(lon_min, lon_max)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.ceil((lat_max - lat_min) / height) + 1
+        cols = math.ceil(span / width) + 1
+        if rows * cols <= MAX_CELLS:
+            break
+    cells: Set[str] = set()
+    for row in range(rows + 1):
+        latitude = min(lat_max, lat_min + row * height)
+        for col in range(cols + 1):
+            longitude = _wrap(lon_min + min(span, col * width))
+            cells.add(encode(latitude, longitude, precision))
+    return sorted(cells)
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Première chaîne qui ne commence plus par `prefix` (borne haute exclusive de la plage d'index)"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
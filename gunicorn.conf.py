@@ -0,0 +1,58 @@
+# Configuration gunicorn pour la production : gunicorn main:app -c gunicorn.conf.py
+# Chaque worker est un processus uvicorn (boucle asyncio) ; le nombre de workers suit les cœurs disponibles.
+import multiprocessing
+import os
+import tempfile
+from uvicorn_worker import UvicornWorker as _UvicornWorker
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# Avec plusieurs workers, révocations (déconnexion) et budgets de limitation de débit sont partagés par défaut :
+# en mémoire de chaque processus, un jeton révoqué resterait valide sur les autres workers et chaque budget serait multiplié
+if workers > 1:
+    os.environ.setdefault("REVOCATION_DB", os.path.join(tempfile.gettempdir(), f"revocation-{os.getenv('PORT', '8000')}.db"))
+    os.environ.setdefault("RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), f"ratelimit-{os.getenv('PORT', '8000')}.db"))
+
+# Connexions keep-alive, file d'attente du socket et arrêts propres
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+backlog = int(os.getenv("GUNICORN_BACKLOG", 2048))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# Recycle les workers après N requêtes (0 = jamais), avec un décalage aléatoire pour éviter qu'ils redémarrent ensemble
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+# L'application est importée une seule fois dans le processus maître, puis les workers sont créés par fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Proxys dont X-Forwarded-For est cru, adresses ou plages (10.0.0.0/8) : l'IP client sert de clé à la limitation de débit.
+# Derrière un répartiteur de charge, sans cette liste, tous les clients partagent l'adresse du proxy (et ses budgets).
+# "*" croit la première adresse de l'en-tête, que le client peut choisir : préférer les plages du répartiteur.
+# gunicorn n'accepte pas de plages dans forwarded_allow_ips : la liste est transmise directement à uvicorn
+TRUSTED_PROXY_IPS = os.getenv("TRUSTED_PROXY_IPS") or os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+class UvicornWorker(_UvicornWorker):
+    CONFIG_KWARGS = {**_UvicornWorker.CONFIG_KWARGS, "forwarded_allow_ips": TRUSTED_PROXY_IPS}
+
+
+worker_class = UvicornWorker
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Schéma, reprises de données et index de recherche : une seule fois, avant le démarrage des workers
+    import bootstrap
+    bootstrap.init_db()
+    os.environ["DB_AUTO_INIT"] = "false"
+
+
+def post_fork(server, worker):
+    # Les connexions ouvertes par le maître pendant le préchargement ne doivent pas être partagées entre workers
+    from database import engines
+    for target in engines():
+        target.dispose(close=False)
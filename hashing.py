@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+import metrics
+
+# Configuration du hachage (facteur de coût bcrypt, taille du pool, file d'attente)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", 64))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", 1))
+
+_context = None
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+class HashingOverloaded(Exception):
+    """Levée quand trop de calculs bcrypt sont déjà en attente"""
+
+
+def get_context():
+    """CryptContext passlib, créé au premier usage : passlib n'est pas importé au démarrage"""
+    global _context
+    if _context is None:
+        from passlib.context import CryptContext
+        _context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _context
+
+
+def _hash(password: str) -> str:
+    return get_context().hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return get_context().verify_and_update(password, hashed_password)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # "spawn" évite de dupliquer la boucle asyncio et les connexions du processus parent
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _submit(operation: str, func, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise HashingOverloaded("Password hashing queue is full")
+    _pending += 1
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+    finally:
+        _pending -= 1
+        # Inclut l'attente dans la file du pool : c'est le temps réellement ajouté à la requête
+        metrics.observe_bcrypt(operation, time.perf_counter() - started)
+
+
+async def hash_password(password: str) -> str:
+    return await _submit("hash", _hash, password)
+
+
+async def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Vérifie le mot de passe et renvoie un nouveau hash si le facteur de coût a changé"""
+    return await _submit("verify", _verify_and_update, password, hashed_password)
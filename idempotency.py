@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from database import insert_ignore
+
+# Réponses conservées pour l'en-tête Idempotency-Key (en heures)
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 24))
+HEADER = "Idempotency-Key"
+
+
+def fingerprint(operation: str, payload: Any = None) -> str:
+    """Empreinte de la requête : une même clé ne peut pas servir pour une autre requête"""
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{operation}\n{body}".encode("utf-8")).hexdigest()
+
+
+def _expired_before() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(hours=IDEMPOTENCY_TTL)
+
+
+async def replay(db: AsyncSession, user_id: int, key: Optional[str], request_hash: str) -> Optional[Response]:
+    """Réponse déjà envoyée pour cette clé, ou None si la requête doit être exécutée"""
+    if not key:
+        return None
+    stored = await db.scalar(select(models.IdempotencyKey).where(
+        models.IdempotencyKey.user_id == user_id,
+        models.IdempotencyKey.key == key,
+        models.IdempotencyKey.created_at > _expired_before(),
+    ))
+    if stored is None:
+        return None
+    if stored.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key already used for a different request")
+    return Response(
+        content=stored.response,
+        status_code=stored.status_code,
+        media_type="application/json" if stored.response is not None else None,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def save(db: AsyncSession, user_id: int, key: Optional[str], request_hash: str, status_code: int, content: Any = None):
+    """Enregistre la réponse (après l'écriture) et purge les clés expirées de l'utilisateur"""
+    if not key:
+        return
+    await db.execute(delete(models.IdempotencyKey).where(
+        models.IdempotencyKey.user_id == user_id,
+        models.IdempotencyKey.created_at <= _expired_before(),
+    ))
+    response = None if content is None else json.dumps(jsonable_encoder(content))
+    await db.execute(insert_ignore(models.IdempotencyKey.__table__).values(
+        user_id=user_id, key=key, request_hash=request_hash, status_code=status_code, response=response,
+    ))
+    await db.commit()
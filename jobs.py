@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import metrics
+import models
+import search
+import stats
+from database import AsyncWriteSessionLocal, insert_ignore
+
+# Tâches de fond : enregistrées avec l'écriture qui les déclenche, exécutées par des workers asyncio du processus
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))  # 0 = aucune exécution dans ce processus
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 5))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", 2))
+JOB_RETRY_MAX = float(os.getenv("JOB_RETRY_MAX", 300))
+# Une tâche en cours depuis plus longtemps (worker arrêté) est reprise par un autre worker
+JOB_LEASE = float(os.getenv("JOB_LEASE", 300))
+
+logger = logging.getLogger(__name__)
+jobs = models.Job.__table__
+handlers: Dict[str, Callable[..., Awaitable]] = {}
+depth: Dict[str, int] = {"pending": 0, "running": 0, "failed": 0}
+
+_wakeup: Optional[asyncio.Event] = None
+_workers: List[asyncio.Task] = []
+
+
+def handler(kind: str):
+    """Enregistre la fonction qui exécute les tâches `kind` : appelée avec une session d'écriture et le contenu de la tâche.
+
+    Une tâche peut être exécutée plusieurs fois (reprise après un arrêt) : le traitement doit être idempotent.
+    """
+    def register(func):
+        handlers[kind] = func
+        return func
+    return register
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite renvoie des dates naïves (enregistrées en UTC)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def enqueue(db: AsyncSession, kind: str, **payload):
+    """Ajoute une tâche dans la transaction en cours : elle n'existe que si l'écriture est validée.
+
+    Une tâche identique encore en attente n'est pas dupliquée.
+    """
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    now = _now()
+    await db.execute(insert_ignore(jobs).values(
+        kind=kind, payload=body, key=f"{kind}:{hashlib.sha1(body.encode('utf-8')).hexdigest()}",
+        status="pending", attempts=0, max_attempts=JOB_MAX_ATTEMPTS, run_at=now, created_at=now,
+    ))
+    db.sync_session.info["jobs_enqueued"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("jobs_enqueued", False) and _wakeup is not None:
+        _wakeup.set()
+
+
+async def _claim(db: AsyncSession):
+    """Réserve la prochaine tâche due (UPDATE ... RETURNING atomique, sûr entre processus)"""
+    now = _now()
+    due = select(jobs.c.id).where(jobs.c.run_at <= now).order_by(jobs.c.run_at, jobs.c.id).limit(1)
+    if db.bind.dialect.name == "postgresql":
+        due = due.with_for_update(skip_locked=True)
+    job = (await db.execute(
+        update(jobs).where(jobs.c.id == due.scalar_subquery()).values(
+            status="running", key=None, attempts=jobs.c.attempts + 1, run_at=now + timedelta(seconds=JOB_LEASE),
+        ).returning(jobs.c.id, jobs.c.kind, jobs.c.payload, jobs.c.attempts, jobs.c.max_attempts, jobs.c.created_at)
+    )).first()
+    await db.commit()
+    return job
+
+
+async def _retry_later(job, error: Exception) -> str:
+    """Nouvel essai avec un délai exponentiel, ou abandon après max_attempts"""
+    abandoned = job.attempts >= job.max_attempts
+    delay = min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (job.attempts - 1))
+    async with AsyncWriteSessionLocal() as db:
+        await db.execute(update(jobs).where(jobs.c.id == job.id).values(
+            status="failed" if abandoned else "pending",
+            run_at=None if abandoned else _now() + timedelta(seconds=delay),
+            last_error=repr(error)[:2000],
+        ))
+        await db.commit()
+    logger.warning("Job %s (%s) attempt %d failed: %r", job.id, job.kind, job.attempts, error)
+    if not abandoned and _wakeup is not None:
+        # Réveil à l'échéance plutôt qu'au prochain passage périodique
+        asyncio.get_running_loop().call_later(delay, _wakeup.set)
+    return "failed" if abandoned else "retry"
+
+
+async def run_one() -> bool:
+    """Exécute une tâche due ; False s'il n'y en a aucune"""
+    async with AsyncWriteSessionLocal() as db:
+        job = await _claim(db)
+    if job is None:
+        return False
+
+    started = time.perf_counter()
+    waited = (_now() - _aware(job.created_at)).total_seconds()
+    try:
+        func = handlers.get(job.kind)
+        if func is None:
+            raise LookupError(f"No handler for job kind {job.kind!r}")
+        # Traitement et suppression de la tâche dans la même transaction
+        async with AsyncWriteSessionLocal() as db:
+            await func(db, **json.loads(job.payload))
+            await db.execute(delete(jobs).where(jobs.c.id == job.id))
+            await db.commit()
+        outcome = "done"
+    except Exception as error:
+        outcome = await _retry_later(job, error)
+    metrics.observe_job(job.kind, outcome, waited, time.perf_counter() - started)
+    return True
+
+
+async def run_pending() -> int:
+    """Exécute les tâches dues jusqu'à épuisement (scripts, benchmarks) ; renvoie le nombre traité"""
+    count = 0
+    while await run_one():
+        count += 1
+    return count
+
+
+async def refresh_depth():
+    async with AsyncWriteSessionLocal() as db:
+        counts = dict((await db.execute(select(jobs.c.status, func.count()).group_by(jobs.c.status))).all())
+    depth.update({status: counts.get(status, 0) for status in depth})
+
+
+async def _worker(index: int):
+    next_refresh = 0.0
+    while True:
+        try:
+            _wakeup.clear()
+            ran = await run_one()
+            if index == 0 and time.monotonic() >= next_refresh:
+                await refresh_depth()
+                next_refresh = time.monotonic() + JOB_POLL_INTERVAL
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Job worker %d error", index)
+            ran = False
+        if not ran:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+def start(workers: int = JOB_WORKERS):
+    """Lance les workers dans la boucle en cours (au démarrage de l'application)"""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    _workers.extend(asyncio.create_task(_worker(i)) for i in range(workers))
+
+
+async def stop():
+    """Arrête les workers ; une tâche interrompue sera reprise à l'expiration de son bail"""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+@handler("search.index")
+async def _index_properties(db: AsyncSession, property_ids: List[int]):
+    properties = (await db.scalars(select(models.Property).where(models.Property.id.in_(property_ids)))).all()
+    await search.backend.index(db, properties)
+    # Propriétés supprimées entre l'écriture et l'exécution de la tâche
+    removed = set(property_ids) - {p.id for p in properties}
+    if removed:
+        await search.backend.remove(db, removed)
+
+
+# Les réservations mettent à jour les statistiques dans leur transaction ; cette tâche ne sert qu'aux
+# reconstructions complètes et aux tâches enregistrées par une version précédente
+@handler("stats.rebuild")
+async def _rebuild_stats(db: AsyncSession, property_ids: List[int]):
+    await stats.rebuild_properties(db, property_ids)
+
+
+if __name__ == "__main__":
+    # python jobs.py run : exécute les tâches en attente (par exemple avec JOB_WORKERS=0 sur les serveurs web)
+    if sys.argv[1:] != ["run"]:
+        sys.exit("usage: python jobs.py run")
+    print(f"{asyncio.run(run_pending())} job(s) processed")
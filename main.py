@@ -1,26 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+import asyncio
 import crud
-import models
-import uvicorn
 import schemas
 import auth
-from database import engine, get_db
-from typing import List
+import bootstrap
+import bulk
+import hashing
+import idempotency
+import jobs
+import metrics
+import pricing
+import ratelimit
+import response_cache
+import stats
+import streaming
+from database import async_engine, engines, get_async_db, get_write_db, write_engine
+from contextlib import asynccontextmanager
+from pydantic import TypeAdapter
+from typing import List, Optional
 import logging 
 import os
-from dotenv import load_dotenv
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Création du schéma au démarrage plutôt qu'à l'import (voir bootstrap.py)
+    if bootstrap.auto_init():
+        await asyncio.to_thread(bootstrap.init_db)
+    jobs.start()
+    yield
+    # Arrête les tâches de fond, libère le pool bcrypt et les connexions à l'arrêt du serveur
+    await jobs.stop()
+    hashing.shutdown()
+    await async_engine.dispose()
+    await write_engine.dispose()
 
-app = FastAPI(title="Property Management API", docs_url="/docs", redoc_url="/redoc")
+# Réponses encodées par orjson plutôt que par le module json de la bibliothèque standard
+app = FastAPI(
+    title="Property Management API", docs_url="/docs", redoc_url="/redoc", lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 
+# Limitation de débit (429) et contrôle d'admission (503) : ajouté en premier, il reste derrière CORS et les métriques
+app.add_middleware(ratelimit.RateLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,8 +59,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing", "Retry-After"],
 )
 
+# Latence, requêtes SQL et temps bcrypt par route (exposés sur /metrics)
+metrics.instrument(*engines())
+metrics.caches.update({
+    "principal": auth.principal_cache,
+    "property_lists": response_cache.property_lists,
+    "property_details": response_cache.property_details,
+    "price_calendars": pricing.calendars,
+})
+metrics.gauges.update({
+    "rate_limit_buckets": lambda: len(ratelimit.limiter.buckets),
+    "admission_active_requests": lambda: ratelimit.admission.active if ratelimit.admission else 0,
+    "admission_waiting_requests": lambda: ratelimit.admission.waiting if ratelimit.admission else 0,
+    "jobs_pending": lambda: jobs.depth["pending"],
+    "jobs_running": lambda: jobs.depth["running"],
+    "jobs_failed": lambda: jobs.depth["failed"],
+})
+app.add_middleware(metrics.MetricsMiddleware)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -56,22 +103,41 @@ async def root():
         return HTMLResponse(content=html_content, status_code=200)
 
 
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.exception_handler(Exception)
 async def generic_exception_handler(request, exc):
     logger.error(f"Unhandled error: {exc}")
     return JSONResponse(status_code=500, content={"detail": str(exc)})
 
+@app.exception_handler(hashing.HashingOverloaded)
+async def hashing_overloaded_handler(request, exc):
+    # Le pool bcrypt est saturé : on demande au client de réessayer plus tard
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(hashing.HASH_RETRY_AFTER)},
+    )
+
 # Authentication Endpoints
 @app.post("/api/auth/registration/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(
+    user: schemas.UserCreate,
+    db: AsyncSession = Depends(get_async_db),
+    writer: AsyncSession = Depends(get_write_db)
+):
+    # Vérification sur le pool de lecture : la session d'écriture n'est prise qu'après le hachage bcrypt
+    db_user = await crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return await crud.create_user(db=writer, user=user)
 
 @app.post("/api/auth/login/", response_model=schemas.Token)
-def login(user_data: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = auth.authenticate_user(db, user_data.email, user_data.password)
+async def login(user_data: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await auth.authenticate_user(db, user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -80,99 +146,286 @@ def login(user_data: schemas.UserLogin, db: Session = Depends(get_db)):
         )
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=auth.user_token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 
 @app.post("/api/auth/logout/")
-def logout():
+async def logout(token: str = Depends(auth.oauth2_scheme)):
+    await auth.revoke_token(token)
     return {"message": "Successfully logged out"}
 
 @app.get("/api/auth/user/", response_model=schemas.UserDetail)
-def get_current_user_profile(current_user: schemas.User = Depends(auth.get_current_active_user), db: Session = Depends(get_db)):
-    user = crud.get_user(db, current_user.id)
+async def get_current_user_profile(current_user: schemas.User = Depends(auth.get_current_active_user), db: AsyncSession = Depends(get_async_db)):
+    user = await crud.get_user_detail(db, current_user.id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+# Listes : validées et encodées en JSON en un seul passage par des TypeAdapter construits une fois,
+# au lieu de la validation du response_model puis de l'encodage par FastAPI
+property_list_adapter = TypeAdapter(List[schemas.Property])
+property_detail_adapter = TypeAdapter(schemas.PropertyDetail)
+booking_detail_list_adapter = TypeAdapter(List[schemas.BookingDetail])
+favorite_list_adapter = TypeAdapter(List[schemas.Favorite])
+
+def json_list(adapter: TypeAdapter, rows) -> Response:
+    return Response(content=adapter.dump_json(adapter.validate_python(rows, from_attributes=True)), media_type="application/json")
+
 # Property Endpoints
+
 @app.get("/api/properties/", response_model=List[schemas.Property])
-def read_properties(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    properties = crud.get_properties(db, skip=skip, limit=limit)
-    return properties
+async def read_properties(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    city: Optional[str] = None,
+    country: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_capacity: Optional[int] = None,
+    min_bedrooms: Optional[int] = None,
+    is_available: Optional[bool] = None,
+    amenities: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    filters = dict(
+        skip=skip, limit=limit, city=city, country=country,
+        min_price=min_price, max_price=max_price, min_capacity=min_capacity,
+        min_bedrooms=min_bedrooms, is_available=is_available, amenities=amenities, cursor=cursor,
+    )
+    if streaming.wants_ndjson(request, stream):
+        try:
+            query = crud.properties_query(**filters)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return streaming.ndjson_response(query, schemas.Property)
+    
+    key = response_cache.list_key(request)
+    version = await response_cache.lists_version(db)
+    cached = response_cache.lookup(response_cache.property_lists, key, version)
+    if cached is not None:
+        return response_cache.respond(request, cached)
+    
+    generation = response_cache.generation()
+    try:
+        properties = await crud.get_properties(db, **filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    # Curseur de la page suivante, à renvoyer tel quel dans ?cursor=
+    headers = {}
+    if properties and len(properties) == limit:
+        last = properties[-1]
+        headers["X-Next-Cursor"] = crud.encode_cursor(last["created_at"], last["id"])
+    
+    entry = response_cache.build(json_list(property_list_adapter, properties).body, headers, version)
+    response_cache.store(response_cache.property_lists, key, entry, generation)
+    return response_cache.respond(request, entry)
+
+@app.get("/api/properties/search", response_model=List[schemas.Property])
+async def search_properties(
+    q: str,
+    skip: int = 0,
+    limit: int = 20,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Résultats classés par pertinence (titre, équipements puis description)
+    return json_list(property_list_adapter, await crud.search_properties(db, q=q, skip=skip, limit=limit))
+
+@app.get("/api/properties/nearby", response_model=List[schemas.PropertyNearby])
+async def read_nearby_properties(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(5.0, gt=0, le=500, description="Rayon en kilomètres"),
+    limit: int = 50,
+    db: AsyncSession = Depends(get_async_db)
+):
+    nearby = await crud.get_nearby_properties(db, latitude=lat, longitude=lon, radius_km=radius, limit=limit)
+    return [
+        schemas.PropertyNearby(**schemas.Property.model_validate(db_property).model_dump(), distance_km=round(distance, 3))
+        for distance, db_property in nearby
+    ]
+
+@app.get("/api/properties/available", response_model=List[schemas.Property])
+async def read_available_properties(
+    check_in: datetime,
+    check_out: datetime,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if check_out <= check_in:
+        raise HTTPException(status_code=400, detail="check_out must be after check_in")
+    return json_list(property_list_adapter, await crud.get_available_properties(
+        db, check_in=check_in, check_out=check_out, skip=skip, limit=limit
+    ))
 
 @app.post("/api/properties/", response_model=schemas.Property, status_code=status.HTTP_201_CREATED)
-def create_property(
+async def create_property(
     property: schemas.PropertyCreate,
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
+):
+    return await crud.create_property(db=db, property=property, owner_id=current_user.id)
+
+@app.post("/api/properties/bulk", response_model=schemas.BulkImportReport)
+async def bulk_import_properties(
+    request: Request,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_write_db)
+):
+    # Corps NDJSON (une propriété par ligne) ou CSV avec en-tête, lu en flux
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        rows = bulk.iter_csv(request.stream())
+    else:
+        rows = bulk.iter_ndjson(request.stream())
+    try:
+        return await bulk.import_properties(db, rows, owner_id=current_user.id)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8 encoded")
+
+@app.get("/api/properties/export")
+async def export_properties(
+    format: str = "ndjson",
+    current_user: schemas.User = Depends(auth.get_current_active_user)
 ):
-    return crud.create_property(db=db, property=property, owner_id=current_user.id)
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(bulk.export_properties(current_user.id, format), media_type=media_type)
 
 @app.get("/api/properties/{property_id}/", response_model=schemas.PropertyDetail)
-def read_property(property_id: int, db: Session = Depends(get_db)):
-    db_property = crud.get_property(db, property_id=property_id)
+async def read_property(property_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    version = await response_cache.detail_version(db, property_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Property not found")
+    cached = response_cache.lookup(response_cache.property_details, property_id, version)
+    if cached is not None:
+        return response_cache.respond(request, cached)
+    
+    generation = response_cache.generation()
+    db_property = await crud.get_property_detail(db, property_id=property_id)
     if db_property is None:
         raise HTTPException(status_code=404, detail="Property not found")
-    return db_property
+    
+    body = property_detail_adapter.dump_json(property_detail_adapter.validate_python(db_property, from_attributes=True))
+    entry = response_cache.build(body, version=version)
+    response_cache.store(response_cache.property_details, property_id, entry, generation)
+    return response_cache.respond(request, entry)
 
 @app.put("/api/properties/{property_id}/", response_model=schemas.Property)
-def update_property(
+async def update_property(
     property_id: int,
     property_update: schemas.PropertyCreate,
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
-    db_property = crud.update_property(db, property_id=property_id, property_update=property_update, owner_id=current_user.id)
+    db_property = await crud.update_property(db, property_id=property_id, property_update=property_update, owner_id=current_user.id)
     if db_property is None:
         raise HTTPException(status_code=404, detail="Property not found or not authorized")
     return db_property
 
 @app.delete("/api/properties/{property_id}/", status_code=status.HTTP_204_NO_CONTENT)
-def delete_property(
+async def delete_property(
     property_id: int,
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
-    success = crud.delete_property(db, property_id=property_id, owner_id=current_user.id)
+    success = await crud.delete_property(db, property_id=property_id, owner_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Property not found or not authorized")
     return None
 
+@app.post("/api/properties/{property_id}/quote", response_model=schemas.QuoteResponse)
+async def quote_property(property_id: int, quote_request: schemas.QuoteRequest, db: AsyncSession = Depends(get_async_db)):
+    # Tous les séjours sont chiffrés sur le même calendrier en cache (aucune requête par séjour)
+    property = await crud.get_property(db, property_id)
+    if property is None:
+        raise HTTPException(status_code=404, detail="Property not found")
+    prices = await pricing.quote_many(db, property, [(stay.check_in, stay.check_out) for stay in quote_request.stays])
+    return {
+        "property_id": property_id,
+        "quotes": [
+            {"check_in": stay.check_in, "check_out": stay.check_out, "nights": nights, "total_price": total_price}
+            for stay, (nights, total_price) in zip(quote_request.stays, prices)
+        ],
+    }
+
+@app.get("/api/properties/{property_id}/price-rules", response_model=List[schemas.PriceRule])
+async def read_price_rules(property_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await crud.get_price_rules(db, property_id=property_id)
+
+@app.post("/api/properties/{property_id}/price-rules", response_model=schemas.PriceRule, status_code=status.HTTP_201_CREATED)
+async def create_price_rule(
+    property_id: int,
+    rule: schemas.PriceRuleCreate,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_write_db)
+):
+    db_rule = await crud.create_price_rule(db, property_id=property_id, rule=rule, owner_id=current_user.id)
+    if db_rule is None:
+        raise HTTPException(status_code=404, detail="Property not found or not authorized")
+    return db_rule
+
+@app.delete("/api/properties/{property_id}/price-rules/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_price_rule(
+    property_id: int,
+    rule_id: int,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_write_db)
+):
+    success = await crud.delete_price_rule(db, property_id=property_id, rule_id=rule_id, owner_id=current_user.id)
+    if not success:
+        raise HTTPException(status_code=404, detail="Price rule not found or not authorized")
+    return None
+
 # Booking Endpoints
 @app.get("/api/bookings/", response_model=List[schemas.BookingDetail])
-def read_bookings(
+async def read_bookings(
+    request: Request,
+    stream: bool = False,
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    bookings = crud.get_user_bookings(db, user_id=current_user.id)
-    return bookings
+    if streaming.wants_ndjson(request, stream):
+        return streaming.ndjson_response(crud.user_bookings_query(current_user.id), schemas.BookingDetail)
+    return json_list(booking_detail_list_adapter, await crud.get_user_bookings(db, user_id=current_user.id))
 
 @app.post("/api/bookings/", response_model=schemas.Booking, status_code=status.HTTP_201_CREATED)
-def create_booking(
+async def create_booking(
     booking: schemas.BookingCreate,
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
+    if booking.check_out <= booking.check_in:
+        raise HTTPException(status_code=400, detail="check_out must be after check_in")
+
     # Check property availability
-    property = crud.get_property(db, booking.property_id)
+    property = await crud.get_property(db, booking.property_id)
     if not property:
         raise HTTPException(status_code=404, detail="Property not found")
     
     if not property.is_available:
         raise HTTPException(status_code=400, detail="Property is not available")
     
-    return crud.create_booking(db=db, booking=booking, user_id=current_user.id)
+    try:
+        return await crud.create_booking(db=db, booking=booking, user_id=current_user.id)
+    except crud.BookingConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
 
 @app.get("/api/bookings/{booking_id}/", response_model=schemas.BookingDetail)
-def read_booking(
+async def read_booking(
     booking_id: int,
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_booking = crud.get_booking(db, booking_id=booking_id)
+    db_booking = await crud.get_booking(db, booking_id=booking_id)
     if db_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
     
@@ -183,63 +436,146 @@ def read_booking(
     return db_booking
 
 @app.put("/api/bookings/{booking_id}/", response_model=schemas.Booking)
-def update_booking(
+async def update_booking(
     booking_id: int,
     booking_update: schemas.BookingCreate,
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
-    db_booking = crud.update_booking(db, booking_id=booking_id, booking_update=booking_update, user_id=current_user.id)
+    if booking_update.check_out <= booking_update.check_in:
+        raise HTTPException(status_code=400, detail="check_out must be after check_in")
+    try:
+        db_booking = await crud.update_booking(db, booking_id=booking_id, booking_update=booking_update, user_id=current_user.id)
+    except crud.BookingConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
     if db_booking is None:
         raise HTTPException(status_code=404, detail="Booking not found or not authorized")
     return db_booking
 
 @app.delete("/api/bookings/{booking_id}/", status_code=status.HTTP_204_NO_CONTENT)
-def delete_booking(
+async def delete_booking(
     booking_id: int,
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
-    success = crud.delete_booking(db, booking_id=booking_id, user_id=current_user.id)
+    success = await crud.delete_booking(db, booking_id=booking_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Booking not found or not authorized")
     return None
 
+# Owner statistics Endpoints
+@app.get("/api/owners/me/stats", response_model=schemas.OwnerStats)
+async def read_owner_stats(
+    from_month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    to_month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await stats.owner_stats(db, owner_id=current_user.id, from_month=from_month, to_month=to_month)
+
+@app.post("/api/owners/me/stats/rebuild", response_model=schemas.OwnerStats)
+async def rebuild_owner_stats(
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_write_db)
+):
+    # Recalcule les agrégats des propriétés de l'utilisateur à partir des réservations
+    property_ids = [p.id for p in await crud.get_user_properties(db, owner_id=current_user.id)]
+    await stats.rebuild_properties(db, property_ids)
+    await db.commit()
+    return await stats.owner_stats(db, owner_id=current_user.id)
+
 # Favorite Endpoints
 @app.get("/api/favorites/", response_model=List[schemas.Favorite])
-def read_favorites(
+async def read_favorites(
+    request: Request,
+    stream: bool = False,
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if streaming.wants_ndjson(request, stream):
+        return streaming.ndjson_response(crud.favorites_query(current_user.id), schemas.Favorite)
+    return json_list(favorite_list_adapter, await crud.get_favorites(db, user_id=current_user.id))
+
+@app.get("/api/favorites/ids", response_model=List[int])
+async def read_favorite_ids(
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    favorites = crud.get_favorites(db, user_id=current_user.id)
-    return favorites
+    # Uniquement les ids des propriétés, pour afficher les coeurs côté client
+    return await crud.get_favorite_property_ids(db, user_id=current_user.id)
 
 @app.post("/api/favorites/", response_model=schemas.Favorite, status_code=status.HTTP_201_CREATED)
-def create_favorite(
+async def create_favorite(
     favorite: schemas.FavoriteCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
+    request_hash = idempotency.fingerprint("POST /api/favorites/", favorite)
+    replayed = await idempotency.replay(db, current_user.id, idempotency_key, request_hash)
+    if replayed is not None:
+        return replayed
+
     # Check if property exists
-    property = crud.get_property(db, favorite.property_id)
+    property = await crud.get_property(db, favorite.property_id)
     if not property:
         raise HTTPException(status_code=404, detail="Property not found")
     
-    return crud.create_favorite(db=db, favorite=favorite, user_id=current_user.id)
+    db_favorite = schemas.Favorite.model_validate(await crud.create_favorite(db=db, favorite=favorite, user_id=current_user.id))
+    await idempotency.save(db, current_user.id, idempotency_key, request_hash, status.HTTP_201_CREATED, db_favorite)
+    return db_favorite
+
+@app.post("/api/favorites/batch", response_model=schemas.FavoriteBatchResult)
+async def add_favorites(
+    batch: schemas.FavoriteBatch,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_write_db)
+):
+    request_hash = idempotency.fingerprint("POST /api/favorites/batch", batch)
+    replayed = await idempotency.replay(db, current_user.id, idempotency_key, request_hash)
+    if replayed is not None:
+        return replayed
+    added, missing = await crud.add_favorites(db, batch.property_ids, user_id=current_user.id)
+    result = schemas.FavoriteBatchResult(added=added, missing=missing)
+    await idempotency.save(db, current_user.id, idempotency_key, request_hash, status.HTTP_200_OK, result)
+    return result
+
+@app.delete("/api/favorites/batch", response_model=schemas.FavoriteBatchResult)
+async def remove_favorites(
+    batch: schemas.FavoriteBatch,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    current_user: schemas.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_write_db)
+):
+    request_hash = idempotency.fingerprint("DELETE /api/favorites/batch", batch)
+    replayed = await idempotency.replay(db, current_user.id, idempotency_key, request_hash)
+    if replayed is not None:
+        return replayed
+    removed = await crud.remove_favorites(db, batch.property_ids, user_id=current_user.id)
+    result = schemas.FavoriteBatchResult(removed=removed)
+    await idempotency.save(db, current_user.id, idempotency_key, request_hash, status.HTTP_200_OK, result)
+    return result
 
 @app.delete("/api/favorites/{favorite_id}/", status_code=status.HTTP_204_NO_CONTENT)
-def delete_favorite(
+async def delete_favorite(
     favorite_id: int,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     current_user: schemas.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_write_db)
 ):
-    success = crud.delete_favorite(db, favorite_id=favorite_id, user_id=current_user.id)
+    request_hash = idempotency.fingerprint(f"DELETE /api/favorites/{favorite_id}/")
+    replayed = await idempotency.replay(db, current_user.id, idempotency_key, request_hash)
+    if replayed is not None:
+        return replayed
+    success = await crud.delete_favorite(db, favorite_id=favorite_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Favorite not found or not authorized")
+    await idempotency.save(db, current_user.id, idempotency_key, request_hash, status.HTTP_204_NO_CONTENT)
     return None
 
-
 if __name__ == "__main__":
     # Render fournit le port via la variable d'environnement PORT
+    import uvicorn
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
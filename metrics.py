@@ -0,0 +1,214 @@
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+
+# Métriques de l'application au format texte Prometheus (sans dépendance externe)
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", 1024))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Compteurs de la requête en cours : requêtes SQL, temps SQL et temps bcrypt
+_current: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_metrics", default=None)
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Histogramme cumulatif par jeu de labels, plus une fenêtre glissante pour les quantiles"""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS, window: int = METRICS_WINDOW):
+        self.buckets = tuple(buckets)
+        self.window = window
+        self.counts: Dict[Labels, List[int]] = {}
+        self.sums: Dict[Labels, float] = defaultdict(float)
+        self.recent: Dict[Labels, deque] = {}
+
+    def observe(self, labels: Labels, value: float):
+        with _lock:
+            counts = self.counts.get(labels)
+            if counts is None:
+                counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+                self.recent[labels] = deque(maxlen=self.window)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sums[labels] += value
+            self.recent[labels].append(value)
+
+    def quantiles(self, labels: Labels) -> Dict[float, float]:
+        values = sorted(self.recent[labels])
+        return {q: values[min(len(values) - 1, int(len(values) * q))] for q in QUANTILES}
+
+
+requests_total: Dict[Labels, int] = defaultdict(int)
+request_duration = Histogram()
+db_statements_total: Dict[Labels, int] = defaultdict(int)
+db_duration_total: Dict[Labels, float] = defaultdict(float)
+bcrypt_duration = Histogram(buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+in_flight = 0
+# Caches exposés par /metrics : nom -> objet avec .stats() (voir cache.TTLCache)
+caches: Dict[str, object] = {}
+# Tâches de fond (jobs.py) : résultat, attente dans la file depuis l'enregistrement, durée d'exécution
+jobs_total: Dict[Labels, int] = defaultdict(int)
+job_wait = Histogram(buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+job_duration = Histogram()
+# Requêtes refusées avant l'application (limitation de débit, surcharge)
+rejected_total: Dict[Labels, int] = defaultdict(int)
+# Jauges calculées à la lecture de /metrics : nom -> fonction sans argument
+gauges: Dict[str, Callable[[], float]] = {}
+
+
+def _labels(**labels) -> Labels:
+    return tuple(labels.items())
+
+
+def _format_labels(labels: Labels, **extra) -> str:
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in items)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + "}"
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    # Début porté par le contexte d'exécution de l'instruction : rien ne reste sur la connexion si elle échoue
+    context._metrics_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    current = _current.get()
+    if current is not None and started is not None:
+        current["db_count"] += 1
+        current["db_time"] += time.perf_counter() - started
+
+
+def instrument(*engines):
+    """Compte les requêtes SQL et leur durée pour la requête HTTP en cours"""
+    for target in engines:
+        if not event.contains(target, "before_cursor_execute", _before_execute):
+            event.listen(target, "before_cursor_execute", _before_execute)
+            event.listen(target, "after_cursor_execute", _after_execute)
+
+
+def observe_bcrypt(operation: str, duration: float):
+    bcrypt_duration.observe(_labels(operation=operation), duration)
+    current = _current.get()
+    if current is not None:
+        current["bcrypt_time"] += duration
+
+
+def observe_job(kind: str, outcome: str, waited: float, duration: float):
+    job_wait.observe(_labels(kind=kind), waited)
+    job_duration.observe(_labels(kind=kind), duration)
+    with _lock:
+        jobs_total[_labels(kind=kind, outcome=outcome)] += 1
+
+
+def observe_rejection(reason: str, rule: str):
+    with _lock:
+        rejected_total[_labels(reason=reason, rule=rule)] += 1
+
+
+def _route_name(scope) -> str:
+    route = scope.get("route")
+    # Le gabarit de chemin (/api/properties/{property_id}/) évite une série par identifiant
+    return getattr(route, "path", None) or "unmatched"
+
+
+def server_timing(current: Dict[str, float], total: float) -> str:
+    parts = [f"app;dur={total * 1000:.1f}", f'db;dur={current["db_time"] * 1000:.1f};desc="{int(current["db_count"])} queries"']
+    if current["bcrypt_time"]:
+        parts.append(f"bcrypt;dur={current['bcrypt_time'] * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence, requêtes en cours, SQL par route et en-tête Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current = {"db_count": 0, "db_time": 0.0, "bcrypt_time": 0.0}
+        token = _current.set(current)
+        started = time.perf_counter()
+        status_code = 500
+        in_flight += 1
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                header = server_timing(current, time.perf_counter() - started)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            in_flight -= 1
+            _current.reset(token)
+            route = _route_name(scope)
+            labels = _labels(method=scope["method"], route=route)
+            request_duration.observe(labels, time.perf_counter() - started)
+            with _lock:
+                requests_total[_labels(method=scope["method"], route=route, status=str(status_code))] += 1
+                db_statements_total[labels] += current["db_count"]
+                db_duration_total[labels] += current["db_time"]
+
+
+def _histogram_lines(name: str, histogram: Histogram) -> List[str]:
+    lines = [f"# TYPE {name} histogram"]
+    for labels, counts in sorted(histogram.counts.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels, le=le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sums[labels]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return lines
+
+
+def render() -> str:
+    with _lock:
+        lines = ["# TYPE http_requests_total counter"]
+        lines += [f"http_requests_total{_format_labels(labels)} {value}" for labels, value in sorted(requests_total.items())]
+        lines.append("# TYPE http_requests_in_flight gauge")
+        lines.append(f"http_requests_in_flight {in_flight}")
+        lines += _histogram_lines("http_request_duration_seconds", request_duration)
+        # Quantiles sur les METRICS_WINDOW dernières requêtes de chaque route
+        lines.append("# TYPE http_request_duration_quantile_seconds summary")
+        for labels in sorted(request_duration.recent):
+            for q, value in request_duration.quantiles(labels).items():
+                lines.append(f"http_request_duration_quantile_seconds{_format_labels(labels, quantile=q)} {value}")
+        lines.append("# TYPE db_statements_total counter")
+        lines += [f"db_statements_total{_format_labels(labels)} {value}" for labels, value in sorted(db_statements_total.items())]
+        lines.append("# TYPE db_statement_duration_seconds_total counter")
+        lines += [f"db_statement_duration_seconds_total{_format_labels(labels)} {value}" for labels, value in sorted(db_duration_total.items())]
+        lines += _histogram_lines("bcrypt_duration_seconds", bcrypt_duration)
+        lines.append("# TYPE jobs_total counter")
+        lines += [f"jobs_total{_format_labels(labels)} {value}" for labels, value in sorted(jobs_total.items())]
+        lines += _histogram_lines("job_wait_seconds", job_wait)
+        lines += _histogram_lines("job_duration_seconds", job_duration)
+        lines.append("# TYPE http_requests_rejected_total counter")
+        lines += [f"http_requests_rejected_total{_format_labels(labels)} {value}" for labels, value in sorted(rejected_total.items())]
+        for name, gauge in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {gauge()}")
+        for metric, kind in (("hits", "counter"), ("misses", "counter"), ("size", "gauge")):
+            name = f"cache_{metric}_total" if kind == "counter" else f"cache_{metric}"
+            lines.append(f"# TYPE {name} {kind}")
+            lines += [f"{name}{_format_labels(_labels(cache=cache_name))} {cache.stats()[metric]}" for cache_name, cache in sorted(caches.items())]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.engine import Connection
+import models
+from database import engine, insert_ignore
+
+# Évolutions du schéma pour les bases créées avant l'ajout de colonnes ou d'index.
+# Une base neuve est créée directement dans l'état final par create_all : les migrations
+# y sont seulement enregistrées. Chaque migration doit rester idempotente.
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", String(64), primary_key=True),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def add_column(conn: Connection, table: str, column: str):
+    """Ajoute une colonne déclarée dans models si elle manque (ALTER TABLE ... ADD COLUMN)"""
+    if column in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    # Définition complète (type, DEFAULT, NOT NULL) telle que create_all l'écrirait
+    definition = CreateColumn(models.Base.metadata.tables[table].c[column]).compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {definition}')
+
+
+def create_indexes(conn: Connection, table: str, *names: str):
+    """Crée les index déclarés dans models qui n'existent pas encore"""
+    for index in models.Base.metadata.tables[table].indexes:
+        if not names or index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def _0001_property_geolocation(conn: Connection):
+    for column in ("latitude", "longitude", "geohash"):
+        add_column(conn, "properties", column)
+    create_indexes(conn, "properties", "ix_properties_geohash")
+
+
+def _0002_search_and_overlap_indexes(conn: Connection):
+    # Index de pagination, de filtres et de chevauchement ajoutés après la création des premières bases
+    create_indexes(conn, "properties")
+    create_indexes(conn, "bookings", "ix_bookings_property_id_check_in_check_out")
+
+
+def _0003_foreign_key_indexes(conn: Connection):
+    create_indexes(conn, "properties", "ix_properties_owner_id")
+    create_indexes(conn, "bookings", "ix_bookings_user_id")
+    create_indexes(conn, "favorites", "ix_favorites_property_id")
+
+
+def _0004_property_pricing_version(conn: Connection):
+    add_column(conn, "properties", "pricing_version")
+
+
+def _0005_property_created_at_microseconds(conn: Connection):
+    # SQLite : les dates écrites par server_default (CURRENT_TIMESTAMP) n'ont pas de microsecondes, or la
+    # pagination par curseur compare du texte au format de SQLAlchemy ("AAAA-MM-JJ HH:MM:SS.ffffff")
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql(
+            "UPDATE properties SET created_at = created_at || '.000000' WHERE length(created_at) = 19"
+        )
+
+
+def _0006_response_cache_versions(conn: Connection):
+    add_column(conn, "properties", "cache_version")
+    conn.execute(insert_ignore(models.CacheVersion.__table__).values(name="property_lists", version=0))
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_property_geolocation", _0001_property_geolocation),
+    ("0002_search_and_overlap_indexes", _0002_search_and_overlap_indexes),
+    ("0003_foreign_key_indexes", _0003_foreign_key_indexes),
+    ("0004_property_pricing_version", _0004_property_pricing_version),
+    ("0005_property_created_at_microseconds", _0005_property_created_at_microseconds),
+    ("0006_response_cache_versions", _0006_response_cache_versions),
+]
+
+
+def migrate() -> List[str]:
+    """Applique les migrations en attente, chacune dans sa transaction ; renvoie les versions appliquées"""
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        done = set(conn.scalars(select(schema_migrations.c.version)))
+    applied = []
+    for version, migration in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            migration(conn)
+            conn.execute(schema_migrations.insert().values(version=version, applied_at=datetime.now(timezone.utc)))
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    # python migrations.py (les tables absentes sont d'abord créées, comme dans bootstrap.init_db)
+    models.Base.metadata.create_all(bind=engine)
+    applied = migrate()
+    print("\n".join(applied) if applied else "Schema up to date")
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Text, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from database import Base
 
 class User(Base):
@@ -33,14 +34,64 @@ class Property(Base):
     capacity = Column(Integer, default=1)
     bedrooms = Column(Integer, default=1)
     bathrooms = Column(Integer, default=1)
-    amenities = Column(Text)  # JSON string or comma-separated
+    amenities = Column(Text)  # Copie dénormalisée "wifi,pool" ; la source de vérité est property_amenities
     is_available = Column(Boolean, default=True)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    geohash = Column(String(12), index=True)  # Calculé à partir de latitude/longitude pour la recherche de proximité
     owner_id = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Incrémenté à chaque modification des règles de prix : invalide les calendriers en cache des autres workers
+    pricing_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    # Incrémenté à chaque écriture visible dans la fiche (propriété, réservations) : périme la fiche en cache de tous les workers
+    cache_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    # Valeur Python pour garder la même précision que les curseurs de pagination
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), default=lambda: datetime.now(timezone.utc))
     
     owner = relationship("User", back_populates="properties")
     bookings = relationship("Booking", back_populates="property")
     favorites = relationship("Favorite", back_populates="property")
+    
+    # Index composites pour la recherche filtrée avec pagination par curseur (created_at, id)
+    __table_args__ = (
+        Index("ix_properties_created_at_id", "created_at", "id"),
+        Index("ix_properties_city_created_at_id", "city", "created_at", "id"),
+        Index("ix_properties_country_created_at_id", "country", "created_at", "id"),
+        Index("ix_properties_available_created_at_id", "is_available", "created_at", "id"),
+        Index("ix_properties_price_per_night", "price_per_night"),
+        # Propriétés d'un propriétaire (liste, export, statistiques)
+        Index("ix_properties_owner_id", "owner_id"),
+    )
+
+class PriceRule(Base):
+    __tablename__ = "price_rules"
+    
+    # Prix d'une période (dates incluses, sans limite si NULL) et/ou de certains jours de la semaine (voir pricing.py)
+    id = Column(Integer, primary_key=True)
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String)
+    start_date = Column(Date)
+    end_date = Column(Date)
+    weekdays = Column(Integer, nullable=False, default=0)  # Masque de bits, bit 0 = lundi ; 0 = tous les jours
+    price_per_night = Column(Float)  # Prix fixe de la nuit...
+    multiplier = Column(Float)  # ...ou coefficient appliqué au prix de base
+    priority = Column(Integer, nullable=False, default=0)  # La règle applicable de plus haute priorité l'emporte
+
+class Amenity(Base):
+    __tablename__ = "amenities"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+
+class PropertyAmenity(Base):
+    __tablename__ = "property_amenities"
+    
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    amenity_id = Column(Integer, ForeignKey("amenities.id"), primary_key=True)
+    
+    # Index inverse pour retrouver les propriétés à partir des équipements demandés
+    __table_args__ = (
+        Index("ix_property_amenities_amenity_id_property_id", "amenity_id", "property_id"),
+    )
 
 class Booking(Base):
     __tablename__ = "bookings"
@@ -54,10 +105,27 @@ class Booking(Base):
     status = Column(String, default="pending")  # pending, confirmed, cancelled, completed
     guests = Column(Integer, default=1)
     special_requests = Column(Text)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Valeur côté Python : disponible après l'INSERT sans relire la ligne
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), default=lambda: datetime.now(timezone.utc))
     
     property = relationship("Property", back_populates="bookings")
     user = relationship("User", back_populates="bookings")
+    
+    # Index d'intervalle pour détecter les chevauchements de réservations par propriété
+    __table_args__ = (
+        Index("ix_bookings_property_id_check_in_check_out", "property_id", "check_in", "check_out"),
+        Index("ix_bookings_user_id", "user_id"),
+    )
+
+class PropertyMonthlyStats(Base):
+    __tablename__ = "property_monthly_stats"
+    
+    # Agrégats maintenus dans la même transaction que les réservations (voir stats.py)
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(String(7), primary_key=True)  # "YYYY-MM"
+    bookings = Column(Integer, nullable=False, default=0)
+    nights = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
 
 class Favorite(Base):
     __tablename__ = "favorites"
@@ -72,4 +140,41 @@ class Favorite(Base):
     
     __table_args__ = (
         UniqueConstraint('user_id', 'property_id', name='unique_user_property'),
-    )
\ No newline at end of file
+        # unique_user_property couvre les recherches par utilisateur ; celui-ci sert à la suppression d'une propriété
+        Index("ix_favorites_property_id", "property_id"),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    # Réponse enregistrée pour un en-tête Idempotency-Key, rejouée si la requête est renvoyée
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    # Tâche de fond enregistrée dans la transaction de l'écriture qui la déclenche (voir jobs.py)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(64), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    # Dédoublonnage des tâches en attente ; effacée au démarrage de la tâche
+    key = Column(String(128), unique=True)
+    status = Column(String(16), nullable=False, default="pending")  # pending, running, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    # Prochaine exécution, ou fin du bail d'une tâche en cours ; NULL une fois la tâche abandonnée
+    run_at = Column(DateTime(timezone=True), index=True)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+    
+    # Compteurs partagés entre workers, incrémentés dans la transaction qui modifie les données (voir response_cache.py)
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
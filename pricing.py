@@ -0,0 +1,166 @@
+import os
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from itertools import accumulate
+from typing import List, Sequence, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from cache import TTLCache
+
+# Calendrier de prix par propriété : prix de chaque nuit sur PRICING_HORIZON_DAYS jours à partir d'aujourd'hui,
+# et leurs sommes cumulées (le prix d'un séjour est la différence de deux sommes)
+PRICING_HORIZON_DAYS = int(os.getenv("PRICING_HORIZON_DAYS", 730))
+# Séjour le plus long accepté (réservations et devis)
+MAX_STAY_NIGHTS = int(os.getenv("MAX_STAY_NIGHTS", PRICING_HORIZON_DAYS))
+PRICING_CACHE_SIZE = int(os.getenv("PRICING_CACHE_SIZE", 1024))
+PRICING_CACHE_TTL = float(os.getenv("PRICING_CACHE_TTL", 3600))
+calendars = TTLCache(maxsize=PRICING_CACHE_SIZE, ttl=PRICING_CACHE_TTL)
+
+
+def nights(check_in: datetime, check_out: datetime) -> int:
+    """Nuits facturées, comptées sur les dates (au moins une, comme dans stats.contributions)"""
+    return max(1, (check_out.date() - check_in.date()).days)
+
+
+def weekday_mask(weekdays: Sequence[int]) -> int:
+    """[5, 6] (samedi, dimanche) -> masque de bits ; liste vide -> 0 (tous les jours)"""
+    mask = 0
+    for day in weekdays:
+        mask |= 1 << day
+    return mask
+
+
+def weekdays_of(mask: int) -> List[int]:
+    return [day for day in range(7) if mask >> day & 1]
+
+
+def _rule_price(rule: models.PriceRule, base_price: float) -> float:
+    return rule.price_per_night if rule.price_per_night is not None else base_price * rule.multiplier
+
+
+def _rules_on(rule: models.PriceRule, day: date) -> bool:
+    return (rule.start_date is None or rule.start_date <= day) and (rule.end_date is None or day <= rule.end_date)
+
+
+def _applies(rule: models.PriceRule, day: date) -> bool:
+    return _rules_on(rule, day) and (not rule.weekdays or rule.weekdays >> day.weekday() & 1)
+
+
+class PriceCalendar:
+    """Prix des nuits d'une propriété à partir de `start`, règles appliquées par priorité croissante"""
+
+    def __init__(self, base_price: float, rules: Sequence[models.PriceRule], start: date, days: int, version: int):
+        self.base_price = base_price
+        self.rules = list(rules)
+        self.start = start
+        self.version = version
+        prices = [base_price] * days
+        end = start + timedelta(days=days - 1)
+        for rule in self.rules:
+            price = _rule_price(rule, base_price)
+            first = max(rule.start_date or start, start)
+            last = min(rule.end_date or end, end)
+            for offset in range((first - start).days, (last - start).days + 1):
+                if not rule.weekdays or rule.weekdays >> ((start.weekday() + offset) % 7) & 1:
+                    prices[offset] = price
+        self.prices = array("d", prices)
+        self.sums = array("d", accumulate(prices, initial=0.0))
+
+    def nightly_price(self, day: date) -> float:
+        offset = (day - self.start).days
+        if 0 <= offset < len(self.prices):
+            return self.prices[offset]
+        # Hors de l'horizon précalculé : règles évaluées pour cette nuit
+        price = self.base_price
+        for rule in self.rules:
+            if _applies(rule, day):
+                price = _rule_price(rule, self.base_price)
+        return price
+
+    def total(self, first_night: date, count: int) -> float:
+        first = (first_night - self.start).days
+        last = first + count
+        # Partie dans l'horizon par les sommes cumulées, le reste par intervalles de règles
+        inside_first, inside_last = max(first, 0), min(last, len(self.prices))
+        if inside_first >= inside_last:
+            return self._rules_total(first_night, count)
+        total = self.sums[inside_last] - self.sums[inside_first]
+        if first < inside_first:
+            total += self._rules_total(first_night, inside_first - first)
+        if inside_last < last:
+            total += self._rules_total(self.start + timedelta(days=inside_last), last - inside_last)
+        return total
+
+    def _rules_total(self, first_night: date, count: int) -> float:
+        """Somme hors horizon : entre deux bornes de règles, le prix ne dépend que du jour de la semaine.
+
+        O(règles²) quel que soit le nombre de nuits.
+        """
+        end = first_night + timedelta(days=count)
+        bounds = {first_night, end}
+        for rule in self.rules:
+            if rule.start_date is not None and first_night < rule.start_date < end:
+                bounds.add(rule.start_date)
+            if rule.end_date is not None and first_night <= rule.end_date < end - timedelta(days=1):
+                bounds.add(rule.end_date + timedelta(days=1))
+        bounds = sorted(bounds)
+        total = 0.0
+        for start, stop in zip(bounds, bounds[1:]):
+            by_weekday = [self.base_price] * 7
+            for rule in self.rules:
+                if _rules_on(rule, start):
+                    price = _rule_price(rule, self.base_price)
+                    for day in range(7):
+                        if not rule.weekdays or rule.weekdays >> day & 1:
+                            by_weekday[day] = price
+            weeks, rest = divmod((stop - start).days, 7)
+            total += weeks * sum(by_weekday) + sum(by_weekday[(start.weekday() + i) % 7] for i in range(rest))
+        return total
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+async def get_calendar(db: AsyncSession, property: models.Property) -> PriceCalendar:
+    """Calendrier en cache, reconstruit si les règles, le prix de base ou le jour ont changé"""
+    today = _today()
+    calendar = calendars.get(property.id)
+    if (calendar is None or calendar.version != property.pricing_version or calendar.start != today
+            or calendar.base_price != property.price_per_night):
+        rules = (await db.scalars(
+            select(models.PriceRule).where(models.PriceRule.property_id == property.id)
+            .order_by(models.PriceRule.priority, models.PriceRule.id)
+        )).all()
+        calendar = PriceCalendar(property.price_per_night, rules, today, PRICING_HORIZON_DAYS, property.pricing_version)
+        calendars.set(property.id, calendar)
+    return calendar
+
+
+async def quote(db: AsyncSession, property: models.Property, check_in: datetime, check_out: datetime) -> Tuple[int, float]:
+    """(nuits, prix total) d'un séjour"""
+    calendar = await get_calendar(db, property)
+    count = nights(check_in, check_out)
+    return count, round(calendar.total(check_in.date(), count), 2)
+
+
+async def quote_many(db: AsyncSession, property: models.Property, stays: Sequence[Tuple[datetime, datetime]]) -> List[Tuple[int, float]]:
+    """Plusieurs séjours avec un seul calendrier (au plus une requête pour les règles)"""
+    calendar = await get_calendar(db, property)
+    results = []
+    for check_in, check_out in stays:
+        count = nights(check_in, check_out)
+        results.append((count, round(calendar.total(check_in.date(), count), 2)))
+    return results
+
+
+async def rules_changed(db: AsyncSession, property_id: int):
+    """Dans la transaction qui modifie les règles : les autres workers verront la nouvelle version"""
+    await db.execute(update(models.Property).where(models.Property.id == property_id).values(
+        pricing_version=models.Property.pricing_version + 1
+    ).execution_options(synchronize_session=False))
+
+
+def invalidate(property_id: int):
+    calendars.pop(property_id)
@@ -0,0 +1,279 @@
+import asyncio
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import FrozenSet, List, NamedTuple, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+import auth
+import metrics
+from cache import TTLCache
+
+# Budgets "N/second|minute|hour" : rafale de N requêtes, puis N par période ; vide ou "0" désactive la règle
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "10/minute")
+RATE_LIMIT_USER = os.getenv("RATE_LIMIT_USER", "600/minute")
+RATE_LIMIT_IP = os.getenv("RATE_LIMIT_IP", "300/minute")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100_000))
+# Fichier SQLite partagé entre workers ; sinon chaque worker a ses propres seaux
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB")
+
+# Requêtes traitées simultanément par worker (0 = sans limite), file d'attente au-delà et attente maximale (s)
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 128))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 256))
+ADMISSION_TIMEOUT = float(os.getenv("ADMISSION_TIMEOUT", 2))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+
+# Supervision et documentation : jamais limitées ni mises en file
+EXEMPT_PATHS = ("/metrics", "/docs", "/redoc", "/openapi.json")
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+_RATE = re.compile(r"\s*(\d+)\s*/\s*(second|minute|hour)\s*")
+_UNKNOWN = object()
+
+
+class Rule(NamedTuple):
+    """Budget d'un préfixe de route, par IP ("ip"), par utilisateur connecté ("user") ou par IP anonyme ("anonymous")"""
+    name: str
+    prefix: str
+    methods: Optional[FrozenSet[str]]
+    per: str
+    rate: float
+    capacity: float
+
+
+def parse_rate(spec: Optional[str]) -> Optional[Tuple[float, float]]:
+    """"10/minute" -> (jetons par seconde, capacité) ; None si la règle est désactivée"""
+    if not spec or spec.strip() == "0":
+        return None
+    match = _RATE.fullmatch(spec)
+    if match is None:
+        raise ValueError(f"Invalid rate limit {spec!r}, expected e.g. '10/minute'")
+    count = int(match.group(1))
+    return (count / PERIODS[match.group(2)], float(count)) if count else None
+
+
+def default_rules() -> List[Rule]:
+    rules = []
+    for name, prefix, methods, per, spec in (
+        # Connexion et inscription : chaque appel coûte un hachage bcrypt
+        ("auth", "/api/auth/", frozenset({"POST"}), "ip", RATE_LIMIT_AUTH),
+        ("user", "/api/", None, "user", RATE_LIMIT_USER),
+        ("anonymous", "/api/", None, "anonymous", RATE_LIMIT_IP),
+    ):
+        parsed = parse_rate(spec)
+        if parsed is not None:
+            rules.append(Rule(name, prefix, methods, per, *parsed))
+    return rules
+
+
+def _refill(state: Optional[Tuple[float, float]], rate: float, capacity: float, now: float, cost: float) -> Tuple[float, float]:
+    """Jetons restants après consommation et délai avant nouvel essai (0 si la requête passe)"""
+    tokens = capacity if state is None else min(capacity, state[0] + max(0.0, now - state[1]) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryBuckets:
+    """Seaux à jetons du worker : clé -> (jetons, mise à jour, plein à), du moins au plus récemment utilisé.
+
+    Un seau resté inactif le temps de se remplir équivaut à un seau neuf : il est supprimé.
+    Au-delà de `max_keys`, les seaux les plus anciens sont abandonnés.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self.evicted = 0
+
+    def take(self, key: str, rate: float, capacity: float, now: float, cost: float = 1.0) -> float:
+        tokens, wait = _refill(self._buckets.pop(key, None), rate, capacity, now, cost)
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        self._evict(now)
+        return wait
+
+    def _evict(self, now: float):
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+            self.evicted += 1
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteRateLimitBackend:
+    """Seaux partagés entre workers (fichier SQLite local), mis à jour dans une transaction IMMEDIATE"""
+
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_full_at ON rate_limit_buckets (full_at)")
+        self._next_purge = 0.0
+
+    def take(self, key: str, rate: float, capacity: float, now: float, cost: float = 1.0) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._conn.execute("SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+                tokens, wait = _refill(state, rate, capacity, now, cost)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, now + (capacity - tokens) / rate),
+                )
+                if now >= self._next_purge:
+                    self._conn.execute("DELETE FROM rate_limit_buckets WHERE full_at <= ?", (now,))
+                    self._next_purge = now + self.PURGE_INTERVAL
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+
+class RateLimiter:
+    """Applique les règles à une requête ASGI ; les jetons JWT sont décodés une fois par minute au plus"""
+
+    def __init__(self, rules: List[Rule], backend: Optional[SQLiteRateLimitBackend] = None):
+        self.rules = rules
+        self.backend = backend
+        self.buckets = MemoryBuckets()
+        self._identities = TTLCache(maxsize=4096, ttl=60)
+
+    def _user_id(self, scope) -> Optional[int]:
+        authorization = next((value for name, value in scope["headers"] if name == b"authorization"), b"")
+        scheme, _, token = authorization.decode("latin-1").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        user_id = self._identities.get(token, _UNKNOWN)
+        if user_id is _UNKNOWN:
+            # Jeton vérifié : un identifiant falsifié ne doit pas consommer le budget d'un autre utilisateur
+            payload = auth.decode_token(token)
+            user_id = payload.get("uid") if payload else None
+            self._identities.set(token, user_id)
+        return user_id
+
+    async def _take(self, key: str, rule: Rule, now: float) -> float:
+        if self.backend is not None:
+            return await run_in_threadpool(self.backend.take, key, rule.rate, rule.capacity, now)
+        return self.buckets.take(key, rule.rate, rule.capacity, now)
+
+    async def check(self, scope) -> Tuple[Optional[Rule], float]:
+        """Première règle dont le budget est épuisé et délai avant nouvel essai, ou (None, 0)"""
+        path, method = scope["path"], scope["method"]
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+        user_id = _UNKNOWN
+        now = time.time()
+        for rule in self.rules:
+            if not path.startswith(rule.prefix) or (rule.methods is not None and method not in rule.methods):
+                continue
+            identity = ip
+            if rule.per != "ip":
+                if user_id is _UNKNOWN:
+                    user_id = self._user_id(scope)
+                if (rule.per == "user") != (user_id is not None):
+                    continue
+                identity = user_id if user_id is not None else ip
+            wait = await self._take(f"{rule.name}:{identity}", rule, now)
+            if wait:
+                return rule, wait
+        return None, 0.0
+
+
+class Admission:
+    """Nombre de requêtes traitées simultanément ; au-delà, attente bornée en file puis refus (503)"""
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            # Créé dans la boucle du worker (après le fork de gunicorn)
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+limiter = RateLimiter(
+    default_rules() if RATE_LIMIT_ENABLED else [],
+    backend=SQLiteRateLimitBackend(RATE_LIMIT_DB) if RATE_LIMIT_DB and RATE_LIMIT_ENABLED else None,
+)
+admission = Admission(MAX_CONCURRENT_REQUESTS, ADMISSION_QUEUE_SIZE, ADMISSION_TIMEOUT) if MAX_CONCURRENT_REQUESTS > 0 else None
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI : budgets par route (429), puis admission globale (503) avant d'atteindre l'application"""
+
+    def __init__(self, app, limiter: RateLimiter = limiter, admission: Optional[Admission] = admission):
+        self.app = app
+        self.limiter = limiter
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"].startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        rule, wait = await self.limiter.check(scope)
+        if rule is not None:
+            metrics.observe_rejection("rate_limit", rule.name)
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+            await response(scope, receive, send)
+            return
+
+        if self.admission is None:
+            await self.app(scope, receive, send)
+            return
+        if not await self.admission.acquire():
+            metrics.observe_rejection("overloaded", "admission")
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server overloaded, retry later"},
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
@@ -0,0 +1,119 @@
+import hashlib
+import os
+from typing import Dict, Hashable, NamedTuple, Optional
+from fastapi import Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from cache import TTLCache
+
+# Cache des réponses publiques sur les propriétés (corps JSON déjà sérialisé + ETag)
+PROPERTY_CACHE_SIZE = int(os.getenv("PROPERTY_CACHE_SIZE", 512))
+PROPERTY_CACHE_TTL = float(os.getenv("PROPERTY_CACHE_TTL", 30))
+PROPERTY_CACHE_MAX_AGE = int(os.getenv("PROPERTY_CACHE_MAX_AGE", 0))
+
+property_lists = TTLCache(maxsize=PROPERTY_CACHE_SIZE, ttl=PROPERTY_CACHE_TTL)
+property_details = TTLCache(maxsize=PROPERTY_CACHE_SIZE, ttl=PROPERTY_CACHE_TTL)
+
+# Incrémenté à chaque invalidation : une réponse calculée avant une écriture n'est pas mise en cache
+_generation = 0
+
+# Les autres workers ne voient pas les invalidations locales : chaque entrée garde la version partagée
+# (en base) lue avant son calcul, et n'est servie que si cette version n'a pas changé depuis
+PROPERTY_LISTS_VERSION = "property_lists"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+    version: Optional[int] = None
+
+
+def generation() -> int:
+    return _generation
+
+
+def list_key(request: Request) -> Hashable:
+    return tuple(sorted(request.query_params.multi_items()))
+
+
+def invalidate_property(property_id: int):
+    """Une propriété a changé : sa fiche et toutes les pages de liste sont périmées"""
+    global _generation
+    _generation += 1
+    property_lists.clear()
+    property_details.pop(property_id)
+
+
+def invalidate_property_lists():
+    """De nouvelles propriétés existent : seules les pages de liste sont périmées"""
+    global _generation
+    _generation += 1
+    property_lists.clear()
+
+
+def invalidate_property_detail(property_id: int):
+    """Seule la fiche détaillée (qui inclut les réservations) est périmée"""
+    global _generation
+    _generation += 1
+    property_details.pop(property_id)
+
+
+async def lists_version(db: AsyncSession) -> Optional[int]:
+    return await db.scalar(select(models.CacheVersion.version).where(models.CacheVersion.name == PROPERTY_LISTS_VERSION))
+
+
+async def detail_version(db: AsyncSession, property_id: int) -> Optional[int]:
+    """Version de la fiche, None si la propriété n'existe plus"""
+    return await db.scalar(select(models.Property.cache_version).where(models.Property.id == property_id))
+
+
+async def bump_lists(db: AsyncSession):
+    """Dans la transaction qui crée, modifie ou supprime des propriétés"""
+    await db.execute(update(models.CacheVersion).where(models.CacheVersion.name == PROPERTY_LISTS_VERSION).values(
+        version=models.CacheVersion.version + 1
+    ))
+
+
+async def bump_detail(db: AsyncSession, property_id: int):
+    """Dans la transaction qui modifie la propriété ou ses réservations"""
+    await db.execute(update(models.Property).where(models.Property.id == property_id).values(
+        cache_version=models.Property.cache_version + 1
+    ).execution_options(synchronize_session=False))
+
+
+def lookup(cache: TTLCache, key: Hashable, version: Optional[int]) -> Optional[CachedResponse]:
+    entry = cache.get(key)
+    if entry is None or version is None or entry.version != version:
+        return None
+    return entry
+
+
+def build(body: bytes, headers: Optional[Dict[str, str]] = None, version: Optional[int] = None) -> CachedResponse:
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    return CachedResponse(body=body, etag=etag, headers=headers or {}, version=version)
+
+
+def store(cache: TTLCache, key: Hashable, entry: CachedResponse, generation_at_read: int):
+    if generation_at_read == _generation and entry.version is not None:
+        cache.set(key, entry)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def respond(request: Request, entry: CachedResponse) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={PROPERTY_CACHE_MAX_AGE}, must-revalidate",
+        **entry.headers,
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
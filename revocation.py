@@ -0,0 +1,116 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+
+
+class BloomFilter:
+    """Filtre de Bloom : "absent" est certain, "présent" doit être confirmé"""
+
+    def __init__(self, size_bits: int = 1 << 20, hashes: int = 4):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self._bits = bytearray(size_bits // 8 + 1)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.hashes).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 8:(i + 1) * 8], "little") % self.size_bits
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def clear(self):
+        self._bits = bytearray(len(self._bits))
+
+
+class SQLiteRevocationBackend:
+    """Stockage partagé des révocations entre workers (fichier SQLite local)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS revoked_tokens ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, jti TEXT UNIQUE NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def add(self, jti: str, expires_at: float):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)", (jti, expires_at))
+            conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (time.time(),))
+
+    def fetch_since(self, last_id: int) -> List[Tuple[int, str, float]]:
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                "SELECT id, jti, expires_at FROM revoked_tokens WHERE id > ? AND expires_at > ? ORDER BY id",
+                (last_id, time.time()),
+            ).fetchall()
+
+
+class RevocationStore:
+    """Liste des jetons révoqués (claim jti), purgée à leur expiration.
+
+    Les jetons jamais révoqués sont écartés par le filtre de Bloom sans autre coût.
+    Avec un backend partagé, les révocations des autres workers sont récupérées
+    au plus toutes les `sync_interval` secondes.
+    """
+
+    def __init__(self, backend: Optional[SQLiteRevocationBackend] = None, sync_interval: float = 5.0, bloom_bits: int = 1 << 20):
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self._revoked: Dict[str, float] = {}
+        self._bloom = BloomFilter(bloom_bits)
+        self._last_id = 0
+        self._last_sync = 0.0
+        self._next_purge = float("inf")
+
+    def _remember(self, jti: str, expires_at: float):
+        self._revoked[jti] = expires_at
+        self._bloom.add(jti)
+        self._next_purge = min(self._next_purge, expires_at)
+
+    def _purge(self, now: float):
+        if now < self._next_purge:
+            return
+        # Un filtre de Bloom ne supprime pas : on le reconstruit avec les jetons encore valides
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        self._bloom.clear()
+        for jti in self._revoked:
+            self._bloom.add(jti)
+        self._next_purge = min(self._revoked.values(), default=float("inf"))
+
+    async def _sync(self, now: float):
+        if self.backend is None or now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        for row_id, jti, expires_at in await run_in_threadpool(self.backend.fetch_since, self._last_id):
+            self._remember(jti, expires_at)
+            self._last_id = max(self._last_id, row_id)
+
+    async def revoke(self, jti: str, expires_at: float):
+        self._remember(jti, expires_at)
+        if self.backend is not None:
+            await run_in_threadpool(self.backend.add, jti, expires_at)
+
+    async def is_revoked(self, jti: str) -> bool:
+        now = time.time()
+        await self._sync(now)
+        self._purge(now)
+        if jti not in self._bloom:
+            return False
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > now
+
+    def __len__(self):
+        return len(self._revoked)
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+from datetime import date, datetime
 from typing import Optional, List
+import amenities as amenity_utils
+import pricing
 
 # Auth Schemas
 class UserBase(BaseModel):
@@ -18,6 +20,8 @@ class UserLogin(BaseModel):
     password: str
 
 class User(UserBase):
+    # Adresse lue en base, validée à l'inscription : pas de nouvelle validation (coûteuse) à chaque réponse
+    email: str
     id: int
     is_active: bool
     created_at: datetime
@@ -40,8 +44,16 @@ class PropertyBase(BaseModel):
     capacity: int = 1
     bedrooms: int = 1
     bathrooms: int = 1
-    amenities: Optional[str] = None
+    amenities: List[str] = []
     is_available: bool = True
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    
+    @field_validator("amenities", mode="before")
+    @classmethod
+    def parse_amenities(cls, value):
+        # Accepte aussi l'ancien format texte ("wifi,pool" ou JSON)
+        return amenity_utils.normalize(value)
 
 class PropertyCreate(PropertyBase):
     pass
@@ -54,7 +66,24 @@ class Property(PropertyBase):
     class Config:
         from_attributes = True
 
+class PropertyNearby(Property):
+    distance_km: float
+
+class BulkImportError(BaseModel):
+    line: int
+    errors: List[dict]
+
+class BulkImportReport(BaseModel):
+    created: int
+    failed: int
+    errors: List[BulkImportError] = []
+
 # Booking Schemas
+def check_stay_length(stay):
+    if pricing.nights(stay.check_in, stay.check_out) > pricing.MAX_STAY_NIGHTS:
+        raise ValueError(f"Stays are limited to {pricing.MAX_STAY_NIGHTS} nights")
+    return stay
+
 class BookingBase(BaseModel):
     property_id: int
     check_in: datetime
@@ -63,7 +92,9 @@ class BookingBase(BaseModel):
     special_requests: Optional[str] = None
 
 class BookingCreate(BookingBase):
-    pass
+    @model_validator(mode="after")
+    def check_length(self):
+        return check_stay_length(self)
 
 class Booking(BookingBase):
     id: int
@@ -75,6 +106,88 @@ class Booking(BookingBase):
     class Config:
         from_attributes = True
 
+# Pricing Schemas
+class PriceRuleBase(BaseModel):
+    name: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    weekdays: List[int] = []  # 0 = lundi ... 6 = dimanche ; vide = tous les jours
+    price_per_night: Optional[float] = Field(None, gt=0)
+    multiplier: Optional[float] = Field(None, gt=0)
+    priority: int = 0
+
+    @field_validator("weekdays", mode="before")
+    @classmethod
+    def parse_weekdays(cls, value):
+        # Masque de bits en base (voir pricing.weekday_mask)
+        return pricing.weekdays_of(value) if isinstance(value, int) else value
+
+    @field_validator("weekdays")
+    @classmethod
+    def check_weekdays(cls, value):
+        if any(day < 0 or day > 6 for day in value):
+            raise ValueError("weekdays must be between 0 (Monday) and 6 (Sunday)")
+        return sorted(set(value))
+
+class PriceRuleCreate(PriceRuleBase):
+    @model_validator(mode="after")
+    def check_rule(self):
+        if (self.price_per_night is None) == (self.multiplier is None):
+            raise ValueError("Exactly one of price_per_night or multiplier is required")
+        if self.start_date and self.end_date and self.end_date < self.start_date:
+            raise ValueError("end_date must not be before start_date")
+        return self
+
+class PriceRule(PriceRuleBase):
+    id: int
+    property_id: int
+
+    class Config:
+        from_attributes = True
+
+class StayRange(BaseModel):
+    check_in: datetime
+    check_out: datetime
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if self.check_out <= self.check_in:
+            raise ValueError("check_out must be after check_in")
+        return check_stay_length(self)
+
+class QuoteRequest(BaseModel):
+    stays: List[StayRange] = Field(..., min_length=1, max_length=500)
+
+class Quote(StayRange):
+    nights: int
+    total_price: float
+
+class QuoteResponse(BaseModel):
+    property_id: int
+    quotes: List[Quote]
+
+# Owner statistics Schemas
+class MonthlyStats(BaseModel):
+    month: str
+    bookings: int
+    nights: int
+    revenue: float
+    occupancy_rate: float
+
+class PropertyStats(BaseModel):
+    property_id: int
+    title: str
+    bookings: int
+    nights: int
+    revenue: float
+    occupancy_rate: float
+    months: List[MonthlyStats] = []
+
+class OwnerStats(BaseModel):
+    total_bookings: int
+    total_revenue: float
+    properties: List[PropertyStats] = []
+
 # Favorite Schemas
 class FavoriteBase(BaseModel):
     property_id: int
@@ -90,6 +203,14 @@ class Favorite(FavoriteBase):
     class Config:
         from_attributes = True
 
+class FavoriteBatch(BaseModel):
+    property_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+class FavoriteBatchResult(BaseModel):
+    added: int = 0
+    removed: int = 0
+    missing: List[int] = []
+
 # Response schemas with relationships
 class PropertyDetail(Property):
     owner: User
@@ -0,0 +1,130 @@
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Iterable, List
+from sqlalchemy import Column, Integer, MetaData, Table, Text, and_, delete, func, insert, literal_column, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from database import engine
+
+# Colonnes indexées pour la recherche plein texte
+SEARCH_FIELDS = ("title", "description", "amenities")
+
+
+def tokenize(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())
+
+
+class SearchBackend(ABC):
+    """Interface d'un moteur de recherche sur les propriétés ; index et mises à jour facultatifs, requête obligatoire"""
+
+    def create(self, conn: Connection):
+        pass
+
+    def rebuild(self, conn: Connection):
+        pass
+
+    async def index(self, db: AsyncSession, properties: Iterable[models.Property]):
+        pass
+
+    async def remove(self, db: AsyncSession, property_ids: Iterable[int]):
+        pass
+
+    @abstractmethod
+    def query(self, q: str):
+        """Requête SELECT des propriétés correspondant à `q`, triées par pertinence"""
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """Table virtuelle FTS5 dont le rowid est l'id de la propriété, classement bm25"""
+
+    table = Table(
+        "property_search", MetaData(),
+        Column("rowid", Integer, primary_key=True),
+        *(Column(field, Text) for field in SEARCH_FIELDS),
+    )
+    # Poids bm25 par colonne : le titre compte plus que les équipements, puis la description
+    weights = (10.0, 1.0, 5.0)
+
+    def create(self, conn: Connection):
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'property_search'")).first()
+        if exists is None:
+            conn.execute(text(f"CREATE VIRTUAL TABLE property_search USING fts5({', '.join(SEARCH_FIELDS)})"))
+            self.rebuild(conn)
+
+    def rebuild(self, conn: Connection):
+        conn.execute(delete(self.table))
+        conn.execute(insert(self.table).from_select(
+            ["rowid", *SEARCH_FIELDS],
+            select(models.Property.id, *(getattr(models.Property, field) for field in SEARCH_FIELDS)),
+        ))
+
+    async def index(self, db: AsyncSession, properties: Iterable[models.Property]):
+        rows = [{"rowid": p.id, **{field: getattr(p, field) for field in SEARCH_FIELDS}} for p in properties]
+        if rows:
+            await db.execute(delete(self.table).where(self.table.c.rowid.in_([row["rowid"] for row in rows])))
+            await db.execute(insert(self.table), rows)
+
+    async def remove(self, db: AsyncSession, property_ids: Iterable[int]):
+        await db.execute(delete(self.table).where(self.table.c.rowid.in_(list(property_ids))))
+
+    def query(self, q: str):
+        # Chaque mot est cité pour neutraliser la syntaxe FTS5 ; le dernier est cherché en préfixe
+        tokens = tokenize(q)
+        match = " ".join(f'"{token}"' for token in tokens[:-1]) + f' "{tokens[-1]}"*'
+        rank = func.bm25(literal_column("property_search"), *self.weights)
+        return select(models.Property).join(self.table, self.table.c.rowid == models.Property.id).where(
+            text("property_search MATCH :match").bindparams(match=match)
+        ).order_by(rank, models.Property.id)
+
+
+class PostgresBackend(SearchBackend):
+    """tsvector calculé sur les colonnes, indexé par un index GIN d'expression"""
+
+    config = "simple"
+
+    def _document_sql(self) -> str:
+        # Expression IMMUTABLE (concat_ws ne l'est pas) et configuration littérale : l'index et les requêtes
+        # utilisent exactement le même texte, sans quoi le planificateur n'utilise pas l'index
+        fields = " || ' ' || ".join(f"coalesce({field}, '')" for field in SEARCH_FIELDS)
+        return f"to_tsvector('{self.config}'::regconfig, {fields})"
+
+    def _document(self):
+        return literal_column(self._document_sql())
+
+    def create(self, conn: Connection):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_properties_search ON properties USING GIN (({self._document_sql()}))"))
+
+    def query(self, q: str):
+        document = self._document()
+        tsquery = func.plainto_tsquery(literal_column(f"'{self.config}'::regconfig"), " ".join(tokenize(q)))
+        return select(models.Property).where(document.op("@@")(tsquery)).order_by(
+            func.ts_rank(document, tsquery).desc(), models.Property.id
+        )
+
+
+class LikeBackend(SearchBackend):
+    """Repli sans index : chaque mot doit apparaître dans l'une des colonnes"""
+
+    def query(self, q: str):
+        conditions = [
+            or_(*(getattr(models.Property, field).ilike(f"%{token}%") for field in SEARCH_FIELDS))
+            for token in tokenize(q)
+        ]
+        return select(models.Property).where(and_(*conditions)).order_by(models.Property.id)
+
+
+BACKENDS = {"sqlite": SQLiteFTS5Backend, "postgresql": PostgresBackend, "like": LikeBackend}
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND") or (engine.dialect.name if engine.dialect.name in BACKENDS else "like")
+backend: SearchBackend = BACKENDS[SEARCH_BACKEND]()
+
+
+def create_index():
+    with engine.begin() as conn:
+        backend.create(conn)
+
+
+def rebuild_index():
+    with engine.begin() as conn:
+        backend.rebuild(conn)
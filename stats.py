@@ -0,0 +1,183 @@
+import calendar
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from database import engine, insert_ignore
+
+# Statistiques des propriétaires : une ligne par (propriété, mois) au lieu de relire toutes les réservations.
+# Chaque écriture de réservation applique sa part dans sa propre transaction : O(mois), sans relire l'historique.
+STATS_FIELDS = ("bookings", "nights", "revenue")
+
+
+def month_key(day: date) -> str:
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def days_in_month(month: str) -> int:
+    year, number = map(int, month.split("-"))
+    return calendar.monthrange(year, number)[1]
+
+
+def contributions(check_in: datetime, check_out: datetime, total_price: float, status: Optional[str]) -> Dict[str, Tuple[int, int, float]]:
+    """Part d'une réservation dans chaque mois : (réservations, nuits, revenu)
+
+    Les nuits (et le revenu, au prorata) sont réparties sur les mois qu'elles occupent ;
+    la réservation est comptée dans le mois d'arrivée.
+    """
+    if status == "cancelled":
+        return {}
+    first_night = check_in.date()
+    nights = max(1, (check_out.date() - first_night).days)
+    per_night = (total_price or 0.0) / nights
+    result: Dict[str, List] = defaultdict(lambda: [0, 0, 0.0])
+    result[month_key(first_night)][0] = 1
+    # Un passage par mois occupé, pas par nuit
+    day, end = first_night, first_night + timedelta(days=nights)
+    while day < end:
+        next_month = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+        count = (min(next_month, end) - day).days
+        row = result[month_key(day)]
+        row[1] += count
+        row[2] += per_night * count
+        day = next_month
+    return {month: tuple(row) for month, row in result.items()}
+
+
+def _booking_contributions(booking: models.Booking):
+    return contributions(booking.check_in, booking.check_out, booking.total_price, booking.status)
+
+
+async def apply_booking(db: AsyncSession, property_id: int, deltas: Dict[str, Tuple[int, int, float]], sign: int = 1):
+    """Ajoute (sign=1) ou retire (sign=-1) la part d'une réservation, dans la transaction en cours"""
+    if not deltas:
+        return
+    table = models.PropertyMonthlyStats.__table__
+    await db.execute(insert_ignore(table), [{"property_id": property_id, "month": month} for month in deltas])
+    for month, (bookings, nights, revenue) in deltas.items():
+        await db.execute(update(table).where(table.c.property_id == property_id, table.c.month == month).values(
+            bookings=table.c.bookings + sign * bookings,
+            nights=table.c.nights + sign * nights,
+            revenue=table.c.revenue + sign * revenue,
+        ))
+
+
+async def add_booking(db: AsyncSession, booking: models.Booking):
+    await apply_booking(db, booking.property_id, _booking_contributions(booking), 1)
+
+
+async def remove_booking(db: AsyncSession, booking: models.Booking):
+    await apply_booking(db, booking.property_id, _booking_contributions(booking), -1)
+
+
+async def remove_properties(db: AsyncSession, property_ids: Iterable[int]):
+    await db.execute(delete(models.PropertyMonthlyStats).where(models.PropertyMonthlyStats.property_id.in_(list(property_ids))))
+
+
+async def owner_stats(db: AsyncSession, owner_id: int, from_month: Optional[str] = None, to_month: Optional[str] = None):
+    """Lit les agrégats des propriétés du propriétaire : O(propriétés × mois), indépendant du nombre de réservations"""
+    properties = (await db.execute(
+        select(models.Property.id, models.Property.title).where(models.Property.owner_id == owner_id).order_by(models.Property.id)
+    )).all()
+    query = select(models.PropertyMonthlyStats).join(
+        models.Property, models.Property.id == models.PropertyMonthlyStats.property_id
+    ).where(models.Property.owner_id == owner_id).order_by(models.PropertyMonthlyStats.property_id, models.PropertyMonthlyStats.month)
+    if from_month:
+        query = query.where(models.PropertyMonthlyStats.month >= from_month)
+    if to_month:
+        query = query.where(models.PropertyMonthlyStats.month <= to_month)
+    months_by_property = defaultdict(list)
+    for row in (await db.scalars(query)).all():
+        if row.bookings or row.nights:
+            months_by_property[row.property_id].append(row)
+
+    period_days = _period_days(from_month, to_month) if from_month and to_month else None
+    result = []
+    for property_id, title in properties:
+        months = [
+            {"month": row.month, "bookings": row.bookings, "nights": row.nights, "revenue": round(row.revenue, 2),
+             "occupancy_rate": round(row.nights / days_in_month(row.month), 4)}
+            for row in months_by_property[property_id]
+        ]
+        nights = sum(month["nights"] for month in months)
+        # Sans période explicite, le taux d'occupation porte sur les mois ayant des réservations
+        days = period_days or sum(days_in_month(month["month"]) for month in months)
+        result.append({
+            "property_id": property_id,
+            "title": title,
+            "bookings": sum(month["bookings"] for month in months),
+            "nights": nights,
+            "revenue": round(sum(month["revenue"] for month in months), 2),
+            "occupancy_rate": round(nights / days, 4) if days else 0.0,
+            "months": months,
+        })
+    return {
+        "total_bookings": sum(item["bookings"] for item in result),
+        "total_revenue": round(sum(item["revenue"] for item in result), 2),
+        "properties": result,
+    }
+
+
+def _period_days(from_month: str, to_month: str) -> int:
+    year, number = map(int, from_month.split("-"))
+    days = 0
+    while f"{year:04d}-{number:02d}" <= to_month:
+        days += calendar.monthrange(year, number)[1]
+        year, number = (year + 1, 1) if number == 12 else (year, number + 1)
+    return days
+
+
+def _rebuild(conn: Connection, property_ids: Optional[List[int]] = None):
+    table = models.PropertyMonthlyStats.__table__
+    query = select(models.Booking.property_id, models.Booking.check_in, models.Booking.check_out,
+                   models.Booking.total_price, models.Booking.status)
+    if property_ids is not None:
+        conn.execute(delete(table).where(table.c.property_id.in_(property_ids)))
+        query = query.where(models.Booking.property_id.in_(property_ids))
+    else:
+        conn.execute(delete(table))
+
+    totals: Dict[Tuple[int, str], List] = defaultdict(lambda: [0, 0, 0.0])
+    for property_id, check_in, check_out, total_price, status in conn.execute(query.execution_options(yield_per=1000)):
+        for month, values in contributions(check_in, check_out, total_price, status).items():
+            row = totals[(property_id, month)]
+            for i, value in enumerate(values):
+                row[i] += value
+    if totals:
+        conn.execute(table.insert(), [
+            {"property_id": property_id, "month": month, **dict(zip(STATS_FIELDS, values))}
+            for (property_id, month), values in totals.items()
+        ])
+    return len(totals)
+
+
+async def rebuild_properties(db: AsyncSession, property_ids: List[int]):
+    """Recalcule les agrégats des propriétés données, dans la transaction de la session"""
+    return await db.run_sync(lambda session: _rebuild(session.connection(), property_ids))
+
+
+def rebuild(property_ids: Optional[List[int]] = None):
+    """Recalcule les agrégats à partir des réservations (reprise de l'historique ou correction)"""
+    with engine.begin() as conn:
+        return _rebuild(conn, property_ids)
+
+
+def backfill():
+    """Au démarrage : construit les agrégats si la table est vide alors que des réservations existent"""
+    with engine.begin() as conn:
+        if conn.scalar(select(models.PropertyMonthlyStats.property_id).limit(1)) is None \
+                and conn.scalar(select(models.Booking.id).limit(1)) is not None:
+            return _rebuild(conn)
+    return 0
+
+
+if __name__ == "__main__":
+    # python stats.py rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python stats.py rebuild")
+    models.Base.metadata.create_all(bind=engine)
+    print(f"{rebuild()} rows rebuilt")
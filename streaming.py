@@ -0,0 +1,27 @@
+import os
+from typing import AsyncIterator, Type
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.sql import Select
+from database import AsyncSessionLocal
+
+# Réponses en flux NDJSON : une ligne JSON par résultat, mémoire constante
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_YIELD_PER = int(os.getenv("STREAM_YIELD_PER", 500))
+
+
+def wants_ndjson(request: Request, stream: bool = False) -> bool:
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def iter_ndjson(query: Select, schema: Type[BaseModel]) -> AsyncIterator[bytes]:
+    # Session propre au flux : elle doit rester ouverte pendant l'envoi de la réponse
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=STREAM_YIELD_PER))
+        async for partition in result.partitions():
+            yield b"".join(schema.model_validate(row).model_dump_json().encode("utf-8") + b"\n" for row in partition)
+
+
+def ndjson_response(query: Select, schema: Type[BaseModel]) -> StreamingResponse:
+    return StreamingResponse(iter_ndjson(query, schema), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,101 @@
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Configuration lue à l'import des modules de l'application : fixée avant le premier import.
+# Base aiosqlite temporaire, bcrypt au minimum, ni limitation de débit ni workers de tâches
+TEST_SETTINGS = {
+    "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}",
+    "BCRYPT_ROUNDS": "4",
+    "RATE_LIMIT_ENABLED": "false",
+    "MAX_CONCURRENT_REQUESTS": "0",
+    "JOB_WORKERS": "0",
+}
+os.environ.update(TEST_SETTINGS)
+
+import httpx  # noqa: E402
+import bootstrap  # noqa: E402
+import database  # noqa: E402
+import hashing  # noqa: E402
+import main  # noqa: E402
+import response_cache  # noqa: E402
+
+_ids = itertools.count(1)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    # ASGITransport ne déclenche pas le lifespan : schéma et migrations appliqués ici, une fois
+    bootstrap.init_db()
+    yield
+    hashing.shutdown()
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+        yield client
+    # Chaque test a sa propre boucle : les connexions aiosqlite ne sont pas réutilisées d'un test à l'autre
+    await database.async_engine.dispose()
+    await database.write_engine.dispose()
+
+
+@pytest.fixture
+def signup(client):
+    """Inscrit et connecte un nouvel utilisateur ; renvoie l'en-tête Authorization"""
+    async def signup():
+        n = next(_ids)
+        user = {"email": f"user{n}@example.com", "username": f"user{n}", "password": "secret"}
+        response = await client.post("/api/auth/registration/", json=user)
+        assert response.status_code == 201, response.text
+        response = await client.post("/api/auth/login/", json={"email": user["email"], "password": user["password"]})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return signup
+
+
+@pytest.fixture
+def count_queries(client):
+    """Nombre de requêtes SQL d'un GET (voir database.count_queries), hors caches de réponses.
+
+    Un premier appel met l'utilisateur en cache (auth.principal_cache) : seules les requêtes de l'endpoint sont comptées.
+    """
+    async def count(url, headers=None):
+        await client.get(url, headers=headers)
+        response_cache.property_lists.clear()
+        response_cache.property_details.clear()
+        with database.count_queries() as counter:
+            response = await client.get(url, headers=headers)
+        assert response.status_code == 200, response.text
+        return counter["count"]
+    return count
+
+
+@pytest.fixture
+def run_check():
+    """Exécute un script de benchmarks/ qui signale un échec par son code de sortie.
+
+    Le script a sa propre base temporaire et sa configuration par défaut (pas celle des tests).
+    """
+    def run(script, *args, **settings):
+        env = {key: value for key, value in os.environ.items() if key not in TEST_SETTINGS}
+        env.update(settings)
+        result = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "benchmarks", script), *args],
+            cwd=ROOT, env=env, capture_output=True, text=True, timeout=600,
+        )
+        assert result.returncode == 0, result.stdout[-4000:] + result.stderr[-4000:]
+        return result
+    return run
@@ -0,0 +1,225 @@
+"""Parcours de l'API asynchrone sur une base aiosqlite temporaire"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+import database
+import models
+import pricing
+import response_cache
+
+pytestmark = pytest.mark.anyio
+
+PROPERTY = {"title": "Loft", "price_per_night": 100, "city": "Douala", "country": "CM", "amenities": ["wifi", "pool"]}
+
+
+async def create_property(client, headers, **fields):
+    response = await client.post("/api/properties/", headers=headers, json={**PROPERTY, **fields})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def stay(property_id, check_in, check_out):
+    return {"property_id": property_id, "check_in": f"{check_in}T14:00:00", "check_out": f"{check_out}T10:00:00"}
+
+
+async def test_register_and_login(client):
+    user = {"email": "alice@example.com", "username": "alice", "password": "secret"}
+    response = await client.post("/api/auth/registration/", json=user)
+    assert response.status_code == 201
+    assert response.json()["email"] == "alice@example.com"
+    assert "password" not in response.text
+
+    response = await client.post("/api/auth/registration/", json=user)
+    assert response.status_code == 400
+
+    response = await client.post("/api/auth/login/", json={"email": user["email"], "password": "wrong"})
+    assert response.status_code == 401
+
+    response = await client.post("/api/auth/login/", json={"email": user["email"], "password": "secret"})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.get("/api/auth/user/", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "alice"
+
+
+async def test_requires_authentication(client):
+    response = await client.post("/api/properties/", json=PROPERTY)
+    assert response.status_code == 401
+
+
+async def test_property_crud(client, signup):
+    owner, other = await signup(), await signup()
+    created = await create_property(client, owner)
+    assert created["amenities"] == ["wifi", "pool"]
+
+    response = await client.get(f"/api/properties/{created['id']}/")
+    assert response.status_code == 200
+    assert response.json()["owner"]["id"] == created["owner_id"]
+
+    response = await client.put(f"/api/properties/{created['id']}/", headers=other, json={**PROPERTY, "title": "Stolen"})
+    assert response.status_code == 404
+
+    response = await client.put(f"/api/properties/{created['id']}/", headers=owner, json={**PROPERTY, "price_per_night": 120})
+    assert response.status_code == 200
+    # La fiche en cache est invalidée par la modification
+    response = await client.get(f"/api/properties/{created['id']}/")
+    assert response.json()["price_per_night"] == 120
+
+    response = await client.get("/api/properties/", params={"city": "Douala", "amenities": "pool"})
+    assert created["id"] in [p["id"] for p in response.json()]
+
+    response = await client.delete(f"/api/properties/{created['id']}/", headers=owner)
+    assert response.status_code == 204
+    response = await client.get(f"/api/properties/{created['id']}/")
+    assert response.status_code == 404
+
+
+async def test_property_cursor_pagination(client, signup):
+    owner = await signup()
+    ids = [(await create_property(client, owner, city="Kribi"))["id"] for _ in range(5)]
+    seen, cursor = [], None
+    while True:
+        params = {"city": "Kribi", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/properties/", params=params)
+        seen += [p["id"] for p in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == ids
+
+
+async def test_bookings(client, signup):
+    owner, guest, other = await signup(), await signup(), await signup()
+    property_id = (await create_property(client, owner))["id"]
+
+    response = await client.post("/api/bookings/", headers=guest, json=stay(property_id, "2031-03-01", "2031-03-04"))
+    assert response.status_code == 201
+    booking = response.json()
+    assert booking["total_price"] == 300
+
+    response = await client.post("/api/bookings/", headers=other, json=stay(property_id, "2031-03-03", "2031-03-05"))
+    assert response.status_code == 409
+    response = await client.post("/api/bookings/", headers=other, json=stay(property_id, "2031-03-05", "2031-03-04"))
+    assert response.status_code == 400
+    response = await client.post("/api/bookings/", headers=other, json=stay(property_id, "2031-03-04", "2031-03-05"))
+    assert response.status_code == 201
+
+    response = await client.get("/api/bookings/", headers=guest)
+    assert [b["id"] for b in response.json()] == [booking["id"]]
+    assert response.json()[0]["property"]["id"] == property_id
+
+    response = await client.get(f"/api/bookings/{booking['id']}/", headers=other)
+    assert response.status_code == 403
+
+    response = await client.put(f"/api/bookings/{booking['id']}/", headers=guest, json=stay(property_id, "2031-03-01", "2031-03-03"))
+    assert response.status_code == 200
+    assert response.json()["total_price"] == 200
+
+    response = await client.delete(f"/api/bookings/{booking['id']}/", headers=other)
+    assert response.status_code == 404
+    response = await client.delete(f"/api/bookings/{booking['id']}/", headers=guest)
+    assert response.status_code == 204
+    response = await client.get("/api/bookings/", headers=guest)
+    assert response.json() == []
+
+
+async def test_favorites(client, signup):
+    owner, guest = await signup(), await signup()
+    first, second = [(await create_property(client, owner))["id"] for _ in range(2)]
+
+    response = await client.post("/api/favorites/", headers=guest, json={"property_id": first})
+    assert response.status_code == 201
+    favorite = response.json()
+    # Idempotent : le favori existant est renvoyé
+    response = await client.post("/api/favorites/", headers=guest, json={"property_id": first})
+    assert response.json()["id"] == favorite["id"]
+
+    response = await client.post("/api/favorites/batch", headers=guest, json={"property_ids": [first, second, 999999]})
+    assert response.json() == {"added": 1, "removed": 0, "missing": [999999]}
+
+    response = await client.get("/api/favorites/ids", headers=guest)
+    assert response.json() == [first, second]
+
+    response = await client.delete(f"/api/favorites/{favorite['id']}/", headers=guest)
+    assert response.status_code == 204
+    response = await client.get("/api/favorites/", headers=guest)
+    assert [f["property_id"] for f in response.json()] == [second]
+
+
+async def test_response_cache_sees_other_workers(client, signup):
+    # Écritures faites par un autre worker : versions partagées incrémentées, sans invalidation du cache local
+    owner = await signup()
+    created = await create_property(client, owner, city="Limbe")
+    response = await client.get(f"/api/properties/{created['id']}/")
+    etag = response.headers["etag"]
+    response = await client.get("/api/properties/", params={"city": "Limbe"})
+    assert [p["title"] for p in response.json()] == ["Loft"]
+
+    async with database.AsyncWriteSessionLocal() as db:
+        await db.execute(update(models.Property).where(models.Property.id == created["id"]).values(title="Renamed"))
+        await response_cache.bump_detail(db, created["id"])
+        await response_cache.bump_lists(db)
+        await db.commit()
+
+    response = await client.get(f"/api/properties/{created['id']}/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Renamed"
+    response = await client.get("/api/properties/", params={"city": "Limbe"})
+    assert [p["title"] for p in response.json()] == ["Renamed"]
+
+
+async def test_owner_stats_follow_bookings(client, signup):
+    # Aucune tâche exécutée (JOB_WORKERS=0) : les agrégats sont à jour dès la réponse de l'écriture
+    owner, guest = await signup(), await signup()
+    first = (await create_property(client, owner))["id"]
+    second = (await create_property(client, owner, price_per_night=50))["id"]
+
+    response = await client.post("/api/bookings/", headers=guest, json=stay(first, "2031-05-30", "2031-06-02"))
+    booking = response.json()
+    response = await client.get("/api/owners/me/stats", headers=owner)
+    months = {(p["property_id"], m["month"]): (m["bookings"], m["nights"], m["revenue"])
+              for p in response.json()["properties"] for m in p["months"]}
+    assert months == {(first, "2031-05"): (1, 2, 200), (first, "2031-06"): (0, 1, 100)}
+
+    await client.put(f"/api/bookings/{booking['id']}/", headers=guest, json=stay(second, "2031-06-10", "2031-06-12"))
+    response = await client.get("/api/owners/me/stats", headers=owner)
+    assert [(p["property_id"], p["bookings"], p["nights"], p["revenue"]) for p in response.json()["properties"]] == [
+        (first, 0, 0, 0), (second, 1, 2, 100),
+    ]
+    # Mêmes agrégats qu'une reconstruction complète
+    rebuilt = await client.post("/api/owners/me/stats/rebuild", headers=owner)
+    assert rebuilt.json() == response.json()
+
+    await client.delete(f"/api/bookings/{booking['id']}/", headers=guest)
+    response = await client.get("/api/owners/me/stats", headers=owner)
+    assert response.json()["total_bookings"] == 0
+
+    async with database.AsyncSessionLocal() as db:
+        assert await db.scalar(select(models.Job.id).where(models.Job.kind == "stats.rebuild")) is None
+
+
+async def test_stay_length_and_quotes_past_horizon(client, signup):
+    owner, guest = await signup(), await signup()
+    property_id = (await create_property(client, owner))["id"]
+    # Week-ends à 150 au lieu de 100
+    response = await client.post(f"/api/properties/{property_id}/price-rules", headers=owner,
+                                 json={"weekdays": [5, 6], "price_per_night": 150})
+    assert response.status_code == 201, response.text
+
+    too_long = (date.today() + timedelta(days=pricing.MAX_STAY_NIGHTS + 1)).isoformat()
+    response = await client.post("/api/bookings/", headers=guest, json=stay(property_id, date.today().isoformat(), too_long))
+    assert response.status_code == 422
+    response = await client.post(f"/api/properties/{property_id}/quote",
+                                 json={"stays": [{"check_in": f"{date.today()}T14:00:00", "check_out": f"{too_long}T10:00:00"}]})
+    assert response.status_code == 422
+
+    # Séjour de 70 semaines au-delà de l'horizon précalculé : 5 nuits à 100 et 2 à 150 par semaine
+    check_in = date.today() + timedelta(days=pricing.PRICING_HORIZON_DAYS + 10)
+    check_out = check_in + timedelta(weeks=70)
+    response = await client.post(f"/api/properties/{property_id}/quote",
+                                 json={"stays": [{"check_in": f"{check_in}T14:00:00", "check_out": f"{check_out}T10:00:00"}]})
+    assert response.status_code == 200, response.text
+    assert response.json()["quotes"][0]["total_price"] == 70 * (5 * 100 + 2 * 150)
@@ -0,0 +1,21 @@
+"""Scripts de vérification de benchmarks/ (code de sortie 1 en cas d'échec), avec des volumes réduits"""
+
+
+def test_import_time(run_check):
+    run_check("import_time.py", "--runs", "2", "--budget-ms", "3000")
+
+
+def test_sqlite_concurrent_writers(run_check):
+    run_check("sqlite_stress.py", "--writers", "20", "--ops", "2")
+
+
+def test_query_plans(run_check):
+    run_check("query_plans.py")
+
+
+def test_rate_limit(run_check):
+    run_check("rate_limit.py", "--flood", "40", "--overload", "60", BCRYPT_ROUNDS="4")
+
+
+def test_serialization(run_check):
+    run_check("serialization.py", "--rows", "200", "--repeat", "2")
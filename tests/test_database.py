@@ -0,0 +1,20 @@
+"""Configuration des moteurs selon DATABASE_URL (lue à l'import : un processus par cas)"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT, TEST_SETTINGS
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:"])
+def test_in_memory_sqlite_imports(url):
+    # Pool à connexion unique : pas de pool_size, max_overflow ni pool_timeout
+    env = {key: value for key, value in os.environ.items() if key not in TEST_SETTINGS}
+    result = subprocess.run(
+        [sys.executable, "-c", "import main, database; print(type(database.engine.pool).__name__)"],
+        cwd=ROOT, env={**env, "DATABASE_URL": url}, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-4000:]
+    assert result.stdout.strip() == "SingletonThreadPool"
@@ -0,0 +1,58 @@
+"""Le nombre de requêtes SQL des endpoints qui renvoient des relations ne dépend pas du nombre de lignes (pas de N+1)"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+ROWS = 5
+
+
+async def create_property(client, headers, title="Studio"):
+    response = await client.post("/api/properties/", headers=headers, json={"title": title, "price_per_night": 80})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+async def book(client, headers, property_id, day):
+    response = await client.post("/api/bookings/", headers=headers, json={
+        "property_id": property_id,
+        "check_in": f"2031-01-{day:02d}T12:00:00",
+        "check_out": f"2031-01-{day + 1:02d}T10:00:00",
+    })
+    assert response.status_code == 201, response.text
+
+
+async def guest_with_bookings(client, signup, owner, count):
+    """Un voyageur avec `count` réservations, chacune sur une propriété différente, et autant de favoris"""
+    guest = await signup()
+    for i in range(count):
+        property_id = await create_property(client, owner, f"Studio {i}")
+        await book(client, guest, property_id, day=1)
+        response = await client.post("/api/favorites/", headers=guest, json={"property_id": property_id})
+        assert response.status_code == 201, response.text
+    return guest
+
+
+async def test_bookings_list(client, signup, count_queries):
+    owner = await signup()
+    one = await guest_with_bookings(client, signup, owner, 1)
+    many = await guest_with_bookings(client, signup, owner, ROWS)
+    assert await count_queries("/api/bookings/", one) == await count_queries("/api/bookings/", many)
+
+
+async def test_user_profile(client, signup, count_queries):
+    owner = await signup()
+    one = await guest_with_bookings(client, signup, owner, 1)
+    many = await guest_with_bookings(client, signup, owner, ROWS)
+    # Propriétaire avec plusieurs propriétés, voyageurs avec plusieurs réservations et favoris
+    assert await count_queries("/api/auth/user/", one) == await count_queries("/api/auth/user/", many)
+    assert await count_queries("/api/auth/user/", owner) == await count_queries("/api/auth/user/", one)
+
+
+async def test_property_detail(client, signup, count_queries):
+    owner = await signup()
+    quiet = await create_property(client, owner, "Quiet")
+    busy = await create_property(client, owner, "Busy")
+    for day in range(1, ROWS + 1, 2):
+        await book(client, await signup(), busy, day)
+    await book(client, await signup(), quiet, day=1)
+    assert await count_queries(f"/api/properties/{quiet}/") == await count_queries(f"/api/properties/{busy}/")